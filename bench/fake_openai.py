@@ -0,0 +1,144 @@
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# stand-in for the OpenAI chat completions API with canned AURA answers and a configurable delay
+# judge: calls compute_metrics, then answers with a verdict; aggregator: one suggestion per judge verdict
+# usage: python bench/fake_openai.py --port 8765 --latency 0.5 --jitter 0.1 [--rate-limit 0.1]
+#        OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=bench python app.py
+
+BENCH_METRICS = ["left_elbow_angle", "hand_span", "torso_lean"]
+CANNED_VERDICTS = [
+    {"metric_analyzed": "Elbow Angle", "severity": 2, "suggestion": "Relax the elbows into a softer bend in the middle of the talk."},
+    {"metric_analyzed": "Hand Span", "severity": 1, "suggestion": "Open the hands a little wider at the beginning."},
+    {"metric_analyzed": "Torso Lean", "severity": -1, "suggestion": "Good upright posture, keep it near the end."},
+]
+
+def _tokens(text):
+    return max(1, len(text) // 4) # close enough for load numbers
+
+def _judge_label(name):
+    return name.replace("Judge_", "").replace("_", " ")
+
+def canned_report(messages):
+    # mirror what the aggregator would do with the judges' verdicts it was given
+    suggestions = []
+    try:
+        results = json.loads(messages[-1].get("content") or "{}")
+    except ValueError:
+        results = {}
+    for name, verdicts in (results.items() if isinstance(results, dict) else []):
+        for v in verdicts if isinstance(verdicts, list) else []:
+            suggestions.append({
+                "suggestion": v.get("metric_analyzed", ""),
+                "severity": v.get("severity", 1),
+                "description": f"{_judge_label(name)}: {v.get('suggestion', '')}",
+                "judge": _judge_label(name),
+            })
+    return {"suggestions": suggestions}
+
+def answer(body):
+    # -> (content, tool_calls)
+    messages = body.get("messages", [])
+    tools = {t["function"]["name"] for t in body.get("tools", []) if t.get("type") == "function"}
+    schema = ((body.get("response_format") or {}).get("json_schema") or {}).get("name")
+
+    if schema == "AggregatedReport":
+        return json.dumps(canned_report(messages)), None
+    if schema == "JudgeVerdict":
+        return json.dumps({"verdicts": CANNED_VERDICTS}), None
+    if "compute_metrics" in tools and not any(m.get("role") == "tool" for m in messages):
+        call = {
+            "id": f"call_{uuid.uuid4().hex[:12]}",
+            "type": "function",
+            "function": {"name": "compute_metrics", "arguments": json.dumps({"metric_names": BENCH_METRICS})},
+        }
+        return None, [call]
+    return json.dumps({"verdicts": CANNED_VERDICTS}), None
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # keep-alive, like the real API
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self._send(400, {"error": {"message": "bad json"}})
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._send(404, {"error": {"message": f"no route {self.path}"}})
+
+        server = self.server
+        if random.random() < server.rate_limit:
+            with server.lock:
+                server.rejected += 1
+            return self._send(429, {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                              {"retry-after-ms": "200"})
+        time.sleep(max(0.0, server.latency + random.uniform(-server.jitter, server.jitter)))
+        content, tool_calls = answer(body)
+        prompt = _tokens(json.dumps(body.get("messages", [])))
+        completion = _tokens(content or json.dumps(tool_calls))
+        with server.lock:
+            server.requests += 1
+        self._send(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content, "tool_calls": tool_calls, "refusal": None},
+                "finish_reason": "tool_calls" if tool_calls else "stop",
+                "logprobs": None,
+            }],
+            "usage": {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion},
+        })
+
+    def _send(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+def start(port=0, latency=0.0, jitter=0.0, rate_limit=0.0):
+    # serve on a daemon thread, returns the server; base url is http://127.0.0.1:<server.server_port>/v1
+    # rate_limit: fraction of requests answered with a 429
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    server.latency, server.jitter, server.rate_limit = latency, jitter, rate_limit
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.rejected = 0
+    threading.Thread(target=server.serve_forever, name="fake-openai", daemon=True).start()
+    return server
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--port", default=8765, type=int)
+    parser.add_argument("--latency", default=0.0, type=float, help="seconds per completion")
+    parser.add_argument("--jitter", default=0.0, type=float)
+    parser.add_argument("--rate-limit", default=0.0, type=float, help="fraction of requests rejected with a 429")
+    args = parser.parse_args()
+
+    server = start(args.port, args.latency, args.jitter, args.rate_limit)
+    print(f"fake openai on http://127.0.0.1:{server.server_port}/v1", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+
+# offline end-to-end benchmark: video -> sampling -> landmarks -> landmarks.json/.npy -> judges + aggregator
+# against bench/fake_openai.py, so no webcam or API key is needed and the numbers are repeatable
+# usage: python bench/run_bench.py --video assets/mv.mp4 [--runs 5] [--latency 0.2] [--save-baseline | --baseline bench/baseline.json]
+#        python bench/run_bench.py --synthetic 300   (no video / pose model, serialization and orchestration only)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+WEB = os.path.abspath(os.path.join(HERE, "..", "web"))
+sys.path[:0] = [WEB, HERE]
+os.chdir(WEB) # agent specs, the pose model and the references are found relative to web/, like the app
+
+import fake_openai
+from _trace import tracer
+from _pose import PoseSequence, result_to_array
+from _sampler import VideoSampler
+
+BASELINE = os.path.join(HERE, "baseline.json")
+TRACE_ID = "bench"
+# same sampling as a capture in app.py
+SAVE_INTERVAL = 1
+CAPTURE_DURATION = 10
+UPLOAD_MAX_SIDE = 640
+
+def capture(videos, mode, interval, duration, max_side):
+    from _landmark import landmark
+    detector = landmark(mode)
+    seqs, frames, wall = [], 0, 0.0
+    try:
+        for path in videos:
+            sampler = VideoSampler(path, interval, duration, max_side)
+            if not sampler.isOpened():
+                raise SystemExit(f"cannot open {path}")
+            detector.reset()
+            landmark_dict, timestamp_dict = {}, {}
+            start = last = time.time()
+            for idx, timestamp_ms, frame in sampler:
+                tracer.record("decode", last, time.time())
+                landmark_dict[idx] = result_to_array(detector.get_landmark(frame, timestamp_ms))
+                timestamp_dict[idx] = timestamp_ms
+                last = time.time()
+            wall += time.time() - start
+            frames += len(landmark_dict)
+            sampler.release()
+            seqs.append(PoseSequence.from_frames(landmark_dict, timestamp_dict))
+    finally:
+        detector.shutdown()
+    return seqs, {"frames": frames, "capture_fps": frames / wall if wall else None}
+
+def synthetic(n, seed=0):
+    rng = np.random.default_rng(seed)
+    data = rng.uniform(0.2, 0.8, (n, 33, 4)).astype(np.float32)
+    data[..., 3] = 1.0
+    return PoseSequence(data, timestamps=np.arange(n) * 1000.0 * SAVE_INTERVAL)
+
+def serialize(seq, work_dir):
+    from landmarks_to_json import save_landmarks_to_file
+    from verdict_cache import landmark_digest
+    save_landmarks_to_file(seq, base_dir=work_dir)
+    with tracer.span("digest"):
+        landmark_digest(seq.data)
+
+async def orchestrate(work_dir, runs):
+    from _autogen import build_agents, spawn_judge
+    from agent_loader import close_clients, release_code_tools
+    from landmarks_to_json import convert_reference_dir
+    from pipeline import run_pipeline
+
+    convert_reference_dir()
+    start = time.time()
+    try:
+        for _ in range(runs):
+            feature_extractor, judges, aggregator = build_agents(work_dir) # fresh model contexts, like every analysis
+            with tracer.span("pipeline"):
+                final = await run_pipeline(feature_extractor, judges, aggregator, cache=None,
+                                           spawn=lambda judge: spawn_judge(judge, work_dir))
+            if not json.loads(final):
+                raise RuntimeError("pipeline returned no suggestions")
+    finally:
+        release_code_tools(work_dir)
+        await close_clients()
+    wall = time.time() - start
+    return {"pipelines_per_min": 60 * runs / wall if wall else None}
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError: # windows
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / 2 ** 20
+        except (ImportError, AttributeError):
+            return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2 ** 20 if sys.platform == "darwin" else rss / 1024 # bytes on macOS, KiB elsewhere
+
+def stage_stats(events):
+    by_stage = {}
+    for e in events:
+        by_stage.setdefault(e["stage"], []).append(e["duration"])
+    stats = {}
+    for stage, values in sorted(by_stage.items()):
+        v = np.array(values)
+        stats[stage] = {
+            "count": len(v),
+            "p50": round(float(np.percentile(v, 50)), 5),
+            "p99": round(float(np.percentile(v, 99)), 5),
+            "mean": round(float(v.mean()), 5),
+        }
+    return stats
+
+def compare(report, baseline, tolerance, floor):
+    # slower (or bigger) than the baseline by more than tolerance, and by more than floor seconds for stage times
+    problems = []
+    for stage, base in baseline.get("stages", {}).items():
+        cur = report["stages"].get(stage)
+        if cur is None:
+            problems.append(f"{stage}: missing from this run")
+            continue
+        for q in ("p50", "p99"):
+            if cur[q] > base[q] * (1 + tolerance) and cur[q] - base[q] > floor:
+                problems.append(f"{stage} {q}: {cur[q]:.4f}s vs {base[q]:.4f}s")
+    for name, base in baseline.get("throughput", {}).items():
+        cur = report["throughput"].get(name)
+        if base and cur is not None and cur < base * (1 - tolerance):
+            problems.append(f"{name}: {cur:.2f} vs {base:.2f}")
+    base, cur = baseline.get("peak_rss_mb"), report.get("peak_rss_mb")
+    if base and cur and cur > base * (1 + tolerance):
+        problems.append(f"peak_rss_mb: {cur:.0f} vs {base:.0f}")
+    return problems
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--video", action="append", default=[], help="recorded clip, repeatable")
+    parser.add_argument("--synthetic", type=int, default=0, help="frames of random landmarks instead of a video")
+    parser.add_argument("--mode", default="image", choices=["image", "video"])
+    parser.add_argument("--interval", type=float, default=SAVE_INTERVAL)
+    parser.add_argument("--duration", type=float, default=CAPTURE_DURATION)
+    parser.add_argument("--runs", type=int, default=3, help="pipeline runs per clip")
+    parser.add_argument("--latency", type=float, default=0.0, help="fake model seconds per completion")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="fraction of fake model requests answered with a 429")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--floor", type=float, default=0.005, help="seconds a stage may always drift")
+    parser.add_argument("--out", help="also write the report here")
+    args = parser.parse_args()
+    if not args.video and not args.synthetic:
+        parser.error("give --video or --synthetic")
+
+    server = fake_openai.start(latency=args.latency, jitter=args.jitter, rate_limit=args.rate_limit)
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+    os.environ["OPENAI_API_KEY"] = "bench"
+
+    throughput = {}
+    work_dir = tempfile.mkdtemp(prefix="aura_bench_")
+    try:
+        with tracer.bind(TRACE_ID):
+            if args.video:
+                seqs, info = capture(args.video, args.mode, args.interval, args.duration, UPLOAD_MAX_SIDE)
+                throughput["capture_fps"] = info["capture_fps"]
+            else:
+                seqs = [synthetic(args.synthetic)]
+            for seq in seqs:
+                serialize(seq, work_dir)
+                throughput.update(asyncio.run(orchestrate(work_dir, args.runs)))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        server.shutdown()
+
+    report = {
+        "config": {k: getattr(args, k) for k in ("video", "synthetic", "mode", "interval", "duration", "runs", "latency", "jitter", "rate_limit")},
+        "stages": stage_stats(tracer.timeline(TRACE_ID)),
+        "throughput": {k: round(v, 3) for k, v in throughput.items() if v is not None},
+        "peak_rss_mb": round(peak_rss_mb() or 0, 1) or None,
+        "model_requests": server.requests,
+        "rate_limited": server.rejected,
+    }
+
+    print(f"{'stage':<20}{'count':>7}{'p50 ms':>10}{'p99 ms':>10}")
+    for stage, s in report["stages"].items():
+        print(f"{stage:<20}{s['count']:>7}{s['p50'] * 1000:>10.1f}{s['p99'] * 1000:>10.1f}")
+    print("throughput:", report["throughput"], "peak rss MB:", report["peak_rss_mb"])
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print("baseline written to", args.baseline)
+        return
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != report["config"]:
+            print("warning: baseline was recorded with a different config", baseline.get("config"))
+        problems = compare(report, baseline, args.tolerance, args.floor)
+        for p in problems:
+            print("REGRESSION", p)
+        if problems:
+            sys.exit(1)
+        print("no regression against", args.baseline)
+
+if __name__ == "__main__":
+    main()
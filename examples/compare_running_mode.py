@@ -0,0 +1,71 @@
+import sys
+import time
+import cv2
+import mediapipe as mp
+import numpy as np
+
+# IMAGE vs VIDEO running mode on the same clip: fps, per-frame latency and detection rate
+# usage: python examples/compare_running_mode.py [video_path] [max_frames]
+
+BaseOptions = mp.tasks.BaseOptions
+PoseLandmarker = mp.tasks.vision.PoseLandmarker
+PoseLandmarkerOptions = mp.tasks.vision.PoseLandmarkerOptions
+VisionRunningMode = mp.tasks.vision.RunningMode
+
+model_path = 'model/pose_landmarker_full.task'
+VIDEO_PATH = sys.argv[1] if len(sys.argv) > 1 else 'assets/mv.mp4'
+MAX_FRAMES = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+
+def load_frames(path, max_frames):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        print("Cannot open video", path)
+        exit()
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    frames = []
+    while len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    cap.release()
+    return frames, fps
+
+def run(mode, frames, fps):
+    options = PoseLandmarkerOptions(
+        base_options=BaseOptions(model_asset_path=model_path),
+        running_mode=mode)
+    latency = []
+    detected = 0
+    with PoseLandmarker.create_from_options(options) as landmarker:
+        start = time.perf_counter()
+        for i, frame_rgb in enumerate(frames):
+            mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=frame_rgb)
+            t = time.perf_counter()
+            if mode == VisionRunningMode.VIDEO:
+                result = landmarker.detect_for_video(mp_image, int(i * 1000 / fps))
+            else:
+                result = landmarker.detect(mp_image)
+            latency.append((time.perf_counter() - t) * 1000)
+            detected += bool(result.pose_landmarks)
+        total = time.perf_counter() - start
+    latency = np.array(latency)
+    return {
+        "fps": len(frames) / total,
+        "mean_ms": latency.mean(),
+        "p50_ms": np.percentile(latency, 50),
+        "p95_ms": np.percentile(latency, 95),
+        "detected": detected / len(frames),
+    }
+
+if __name__ == "__main__":
+    frames, fps = load_frames(VIDEO_PATH, MAX_FRAMES)
+    print(f"{VIDEO_PATH}: {len(frames)} frames @ {fps:.1f} fps")
+    results = {
+        "IMAGE": run(VisionRunningMode.IMAGE, frames, fps),
+        "VIDEO": run(VisionRunningMode.VIDEO, frames, fps),
+    }
+    print(f"{'mode':<6} {'fps':>8} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'detected':>9}")
+    for name, r in results.items():
+        print(f"{name:<6} {r['fps']:>8.1f} {r['mean_ms']:>8.2f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['detected']:>9.0%}")
+    print(f"speedup: {results['VIDEO']['fps'] / results['IMAGE']['fps']:.2f}x")
@@ -11,9 +11,10 @@ model_path = 'model/pose_landmarker_full.task'
 
 options = PoseLandmarkerOptions(
     base_options=BaseOptions(model_asset_path=model_path),
-    running_mode=VisionRunningMode.IMAGE)
+    running_mode=VisionRunningMode.VIDEO) # reuse the tracked ROI between frames
 
 prvtime=time.time_ns()
+starttime=time.time_ns()
 with PoseLandmarker.create_from_options(options) as landmarker:
     cap = cv2.VideoCapture(0)
     while True:
@@ -30,7 +31,7 @@ with PoseLandmarker.create_from_options(options) as landmarker:
         frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
         mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=frame_rgb)
 
-        result = landmarker.detect(mp_image)
+        result = landmarker.detect_for_video(mp_image, (time.time_ns()-starttime)//10**6)
 
         if result.pose_landmarks:
             for keyPoint in result.pose_landmarks[0]:
@@ -12,7 +12,7 @@ model_path = 'model/pose_landmarker_full.task'
 
 options = PoseLandmarkerOptions(
     base_options=BaseOptions(model_asset_path=model_path),
-    running_mode=VisionRunningMode.IMAGE
+    running_mode=VisionRunningMode.VIDEO # reuse the tracked ROI between frames
 )
 
 
@@ -22,6 +22,7 @@ cap = cv2.VideoCapture(VIDEO_PATH)
 fps = cap.get(cv2.CAP_PROP_FPS)
 # print(fps)
 prvtime=time.time_ns()
+frame_idx=0
 
 if not cap.isOpened():
     print("Cannot open video")
@@ -50,7 +51,8 @@ with PoseLandmarker.create_from_options(options) as landmarker:
         )
 
         # ===== Pose 偵測 =====
-        result = landmarker.detect(mp_image)
+        result = landmarker.detect_for_video(mp_image, int(frame_idx * 1000 / fps))
+        frame_idx += 1
 
         # ===== 畫 landmark =====
         if result.pose_landmarks:
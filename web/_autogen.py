@@ -1,6 +1,9 @@
 from agent_loader import load_agent_from_json
-from pipeline import run_pipeline
-from landmarks_to_json import save_landmarks_to_file
+from pipeline import iter_pipeline
+from landmarks_to_json import save_landmarks_to_file, convert_reference_dir
+from run_judge import make_metric_tool
+from verdict_cache import VerdictCache, landmark_digest
+from verdict import AggregatedReport
 
 judge_roster = [
     {"id": "Judge_Steve_Jobs", "target_figure": "Steve Jobs"},
@@ -8,28 +11,54 @@ judge_roster = [
     # {"id": "Judge_Elon_Musk", "target_figure": "Elon Musk"},
 ]
 
-async def main(landmark_ret):
-    feature_extractor = load_agent_from_json("../agents/Feature_Extractor.json")
-    score_aggregator = load_agent_from_json("../agents/Score_Aggregator.json")
+verdict_cache = VerdictCache()
+
+def load_judge(judge, work_dir=".coding", live_metrics=None):
+    # live_metrics: metric -> summary of this capture from live.LiveAnalyzer, for this judge's references
+    agent = load_agent_from_json("../agents/Judge.json", extra_tools=[make_metric_tool(judge["id"], work_dir, live_metrics)])
+
+    agent.label = judge["target_figure"]
+    agent._name = judge["id"]
+    agent.live_metrics = live_metrics
+
+    return agent
 
-    judges = []
+def build_agents(work_dir=".coding", live_metrics=None):
+    feature_extractor = load_agent_from_json("../agents/Feature_Extractor.json", work_dir=work_dir)
+    score_aggregator = load_agent_from_json("../agents/Score_Aggregator.json", output_content_type=AggregatedReport)
 
-    for judge in judge_roster:
-        agent = load_agent_from_json("../agents/Judge.json")
+    live_metrics = live_metrics or {}
+    judges = [load_judge(judge, work_dir, live_metrics.get(judge["id"])) for judge in judge_roster]
 
-        agent.label = judge["target_figure"]
-        agent._name = judge["id"]
+    return feature_extractor, judges, score_aggregator
 
-        judges.append(agent)
+def spawn_judge(judge_agent, work_dir=".coding"):
+    # fresh feature extractor and judge for one attempt, nothing shared with the other judges or attempts
+    feature_extractor = load_agent_from_json("../agents/Feature_Extractor.json", work_dir=work_dir)
+    return feature_extractor, load_judge({"id": judge_agent.name, "target_figure": judge_agent.label}, work_dir, judge_agent.live_metrics)
+
+async def stream(landmark_ret, work_dir=".coding", live_metrics=None):
+    feature_extractor, judges, score_aggregator = build_agents(work_dir, live_metrics)
 
     if landmark_ret:
-        save_landmarks_to_file(landmark_ret)
+        save_landmarks_to_file(landmark_ret, base_dir=work_dir)
+    convert_reference_dir()
 
-    result = await run_pipeline(
+    async for event in iter_pipeline(
         feature_extractor=feature_extractor,
         judges=judges,
         aggregator=score_aggregator,
-    )
+        landmark_digest=landmark_digest(landmark_ret.data) if landmark_ret else None,
+        cache=verdict_cache,
+        spawn=lambda judge_agent: spawn_judge(judge_agent, work_dir),
+    ):
+        yield event
+
+async def main(landmark_ret):
+    result = None
+    async for kind, _, content in stream(landmark_ret):
+        if kind == "final":
+            result = content
     print("=====ULTIMATE RESULT=====")
     print(repr(result))
     return result
\ No newline at end of file
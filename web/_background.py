@@ -0,0 +1,26 @@
+import asyncio
+import threading
+
+class BackgroundLoop(object):
+    # one long-lived event loop on a daemon thread, pooled model clients stay bound to it
+    def __init__(self):
+        print("start event loop")
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name="asyncio-loop", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        return self.submit(coro).result(timeout)
+
+    def shutdown(self):
+        print("del event loop")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
@@ -1,4 +1,8 @@
 import cv2
+import threading
+import time
+from collections import deque
+
 class VideoCamera(object):
     def __init__(self):
         #由opencv來獲取預設為0 裝置影像
@@ -11,4 +15,62 @@ class VideoCamera(object):
 
     def get_cam(self):
         ret, frame = self.video.read()
-        return ret,frame
\ No newline at end of file
+        return ret,frame
+
+class CameraBroadcaster(object):
+    # one thread reads and encodes each frame once, every /video_feed viewer gets the latest jpeg
+    def __init__(self, camera, on_frame=None, buffer_size=4, retry_delay=0.5):
+        self.camera = camera
+        self.on_frame = on_frame # on_frame(frame, now) runs in the producer, before encoding
+        self.retry_delay = retry_delay
+        self._frames = deque(maxlen=buffer_size) # (seq, jpeg bytes)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="camera", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped:
+            success, frame = self.camera.get_cam()
+            if not success:
+                time.sleep(self.retry_delay) # camera busy or unplugged, keep trying
+                continue
+
+            if self.on_frame:
+                try:
+                    self.on_frame(frame, time.time())
+                except Exception as e:
+                    print(f"CameraBroadcaster on_frame Error: {e}")
+
+            ret, jpeg = cv2.imencode('.jpg', frame)
+            if not ret:
+                continue
+            with self._cond:
+                self._seq += 1
+                self._frames.append((self._seq, jpeg.tobytes()))
+                self._cond.notify_all()
+
+    def latest(self, after=0, timeout=None):
+        # newest frame with seq > after, frames in between are skipped
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._stopped or self._seq > after, timeout):
+                return None
+            if not self._frames or self._frames[-1][0] <= after:
+                return None
+            return self._frames[-1]
+
+    def subscribe(self):
+        seq = 0
+        while not self._stopped:
+            item = self.latest(seq, timeout=1.0)
+            if item is None:
+                continue
+            seq, jpeg = item
+            yield (b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + jpeg + b"\r\n")
+
+    def shutdown(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._thread.join()
@@ -0,0 +1,54 @@
+import json
+import queue
+import threading
+
+KEEPALIVE = 15 # seconds between SSE comments so proxies keep the stream open
+_CLOSED = object() # queued by close(), ends subscribe()
+
+class EventBroker(object):
+    # fan-out of server-sent events; events since the last reset are replayed to late subscribers
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._history = []
+        self._closed = False
+
+    def reset(self):
+        with self._lock:
+            self._history = []
+
+    def publish(self, event, data):
+        with self._lock:
+            self._history.append((event, data))
+            for q in self._subscribers:
+                q.put((event, data))
+
+    def close(self):
+        # the session is gone, every open stream ends and later subscribers get nothing
+        with self._lock:
+            self._closed = True
+            for q in self._subscribers:
+                q.put(_CLOSED)
+
+    def subscribe(self):
+        q = queue.Queue()
+        with self._lock:
+            if self._closed:
+                return
+            for item in self._history:
+                q.put(item)
+            self._subscribers.append(q)
+        try:
+            while True:
+                try:
+                    item = q.get(timeout=KEEPALIVE)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if item is _CLOSED:
+                    return
+                event, data = item
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        finally:
+            with self._lock:
+                self._subscribers.remove(q)
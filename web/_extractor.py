@@ -0,0 +1,107 @@
+import threading
+import time
+import queue
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from _landmark import landmark
+from _trace import tracer
+
+VIDEO_TRACKS = 4 # video mode landmarkers kept at once, one per capture in flight; the oldest is closed past this
+
+class LandmarkBatch(object):
+    # one capture (webcam or upload); done resolves once sealed and every submitted frame is processed
+    def __init__(self, pool, on_result, tag=None):
+        self.pool = pool
+        self.on_result = on_result
+        self.tag = tag # session id for the trace timeline
+        self.created = time.time()
+        self.done = Future()
+        self.submitted = 0
+        self.completed = 0
+        self._sealed = False
+        self._finished = False
+        self._lock = threading.Lock()
+
+    def submit(self, frame, idx, timestamp_ms=None):
+        with self._lock:
+            if self._sealed:
+                raise RuntimeError("LandmarkBatch: submit after seal")
+            self.submitted += 1
+        self.pool.put(self, frame, idx, timestamp_ms) # blocks while the queue is full
+
+    def seal(self):
+        with self._lock:
+            self._sealed = True
+        self._try_finish()
+
+    def _complete(self):
+        with self._lock:
+            self.completed += 1
+        self._try_finish()
+
+    def _try_finish(self):
+        with self._lock:
+            if self._finished or not self._sealed or self.completed < self.submitted:
+                return
+            self._finished = True
+        self.done.set_result(self.completed)
+
+class LandmarkExtractor(object):
+    def __init__(self, workers=2, queue_size=8, mode="image"):
+        print("start extractor")
+        if mode == "video" and workers != 1:
+            raise ValueError("LandmarkExtractor: video mode tracks across frames and needs a single worker")
+        self.mode = mode
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        for i in range(workers):
+            t = threading.Thread(target=self._work, name=f"landmark-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def batch(self, on_result, tag=None):
+        return LandmarkBatch(self, on_result, tag)
+
+    def put(self, batch, frame, idx, timestamp_ms=None):
+        self._queue.put((batch, frame, idx, timestamp_ms))
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def shutdown(self):
+        print("del extractor")
+        for _ in self._threads:
+            self._queue.put(None)
+        for t in self._threads:
+            t.join()
+
+    def _work(self):
+        # PoseLandmarker is not thread-safe, one per worker; in video mode one per batch too, so captures running
+        # at once are never tracked and smoothed from each other's frames
+        detector = landmark(self.mode) if self.mode != "video" else None
+        tracks = OrderedDict() # batch -> landmark, least recently used first
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            batch, frame, idx, timestamp_ms = job
+            if self.mode == "video":
+                for old in [b for b in tracks if b is not batch and b.done.done()]:
+                    tracks.pop(old).shutdown()
+                detector = tracks.pop(batch, None) or landmark(self.mode)
+                tracks[batch] = detector
+                while len(tracks) > VIDEO_TRACKS: # an abandoned capture that was never sealed
+                    tracks.popitem(last=False)[1].shutdown()
+            try:
+                with tracer.bind(batch.tag):
+                    ret = detector.get_landmark(frame, timestamp_ms)
+                    batch.on_result(idx, frame, ret, timestamp_ms)
+            except Exception as e:
+                print(f"LandmarkExtractor Error: {e}")
+            finally:
+                batch._complete()
+        if self.mode != "video":
+            detector.shutdown()
+        for track in tracks.values():
+            track.shutdown()
@@ -1,29 +1,52 @@
 import mediapipe as mp
 import cv2
+import time
+
+from _trace import tracer
 
 class landmark(object):
-    def __init__(self):
-        print("start mediapipe")
+    # mode "image" detects every frame from scratch, "video" reuses the pose ROI between frames (frames must arrive in order,
+    # from one capture: the extractor keeps one per batch)
+    def __init__(self, mode="image"):
+        print("start mediapipe", mode)
         BaseOptions = mp.tasks.BaseOptions
         PoseLandmarker = mp.tasks.vision.PoseLandmarker
         PoseLandmarkerOptions = mp.tasks.vision.PoseLandmarkerOptions
         VisionRunningMode = mp.tasks.vision.RunningMode
         model_path='../model/pose_landmarker_full.task'
 
+        self.mode = mode
+        running_mode = VisionRunningMode.VIDEO if mode == "video" else VisionRunningMode.IMAGE
+
         options = PoseLandmarkerOptions(
             base_options=BaseOptions(model_asset_path=model_path),
-            running_mode=VisionRunningMode.IMAGE)
-    
+            running_mode=running_mode)
+
         self.landmarker=PoseLandmarker.create_from_options(options)
+        self._t0 = time.monotonic()
+        self._last_ts = -1
 
     def shutdown(self):
         print("del mediapipe")
         if self.landmarker:
             self.landmarker.close()
 
-    def get_landmark(self,frame):
+    def get_landmark(self,frame,timestamp_ms=None):
+        with tracer.span("get_landmark", mode=self.mode):
+            return self._detect(frame, timestamp_ms)
+
+    def _detect(self,frame,timestamp_ms=None):
         frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
         mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=frame_rgb)
-        ret = self.landmarker.detect(mp_image)
+        if self.mode != "video":
+            return self.landmarker.detect(mp_image)
+
+        if timestamp_ms is None:
+            timestamp_ms = (time.monotonic() - self._t0) * 1000
+        ts = int(timestamp_ms)
+        if ts <= self._last_ts:
+            ts = self._last_ts + 1
+        self._last_ts = ts
+        ret = self.landmarker.detect_for_video(mp_image, ts)
         # print(ret)
         return ret
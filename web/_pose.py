@@ -0,0 +1,79 @@
+import json
+import numpy as np
+
+N_LANDMARKS = 33
+FIELDS = ("x", "y", "z", "visibility")
+
+def result_to_array(result):
+    # PoseLandmarkerResult -> (33, 4) float32, None when no pose was detected
+    if not result or not getattr(result, "pose_landmarks", None):
+        return None
+    return np.array(
+        [(p.x, p.y, p.z, getattr(p, "visibility", 0.0) or 0.0) for p in result.pose_landmarks[0]],
+        dtype=np.float32
+    )
+
+class PoseSequence(object):
+    # (frames, 33, 4) float32 [x, y, z, visibility], only frames with a detected pose
+    __slots__ = ("data", "timestamps", "frame_idx")
+
+    def __init__(self, data, timestamps=None, frame_idx=None):
+        self.data = np.asarray(data, dtype=np.float32).reshape(-1, N_LANDMARKS, len(FIELDS))
+        n = len(self.data)
+        self.frame_idx = np.arange(n, dtype=np.int32) if frame_idx is None else np.asarray(frame_idx, dtype=np.int32)
+        self.timestamps = np.full(n, np.nan) if timestamps is None else np.asarray(timestamps, dtype=np.float64)
+
+    @classmethod
+    def from_frames(cls, frames, timestamps=None):
+        # {frame_idx: (33, 4) array or None}, {frame_idx: ms}
+        timestamps = timestamps or {}
+        keys = [i for i in sorted(frames) if frames[i] is not None]
+        if not keys:
+            return cls(np.empty((0, N_LANDMARKS, len(FIELDS)), np.float32))
+        return cls(
+            np.stack([frames[i] for i in keys]),
+            [timestamps.get(i, np.nan) for i in keys],
+            keys
+        )
+
+    @classmethod
+    def from_results(cls, results):
+        return cls.from_frames({i: result_to_array(r) for i, r in enumerate(results)})
+
+    @classmethod
+    def from_list(cls, frames):
+        # the landmarks.json layout: [[{"x", "y", "z", "visibility"} * 33], ...]
+        return cls([[[p.get(k, 0.0) for k in FIELDS] for p in frame] for frame in frames])
+
+    @classmethod
+    def from_json(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_list(json.load(f))
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, i):
+        return self.data[i]
+
+    @property
+    def xy(self):
+        return self.data[..., :2]
+
+    @property
+    def xyz(self):
+        return self.data[..., :3]
+
+    @property
+    def visibility(self):
+        return self.data[..., 3]
+
+    def get(self, frame_idx):
+        rows = np.flatnonzero(self.frame_idx == frame_idx)
+        return self.data[rows[0]] if len(rows) else None
+
+    def take(self, rows):
+        return PoseSequence(self.data[rows], self.timestamps[rows], self.frame_idx[rows])
+
+    def to_list(self):
+        return [[dict(zip(FIELDS, p)) for p in frame] for frame in self.data.tolist()]
@@ -0,0 +1,53 @@
+import cv2
+
+SEEK_MIN_GAP = 2.0 # seconds between kept frames before seeking beats grab()-ing through the gap
+
+def fit_frame(frame, max_side):
+    h, w = frame.shape[:2]
+    scale = max_side / max(h, w) if max_side else 1
+    if scale >= 1:
+        return frame
+    return cv2.resize(frame, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_AREA)
+
+class VideoSampler(object):
+    # decodes only the frames that are kept: grab() skips the rest without retrieve/colour conversion
+    def __init__(self, path, interval, duration, max_side=None):
+        self.video = cv2.VideoCapture(path)
+        self.fps = self.video.get(cv2.CAP_PROP_FPS) or 30
+        self.step = max(1, round(self.fps * interval))
+        self.max_frames = int(self.fps * duration)
+        total = int(self.video.get(cv2.CAP_PROP_FRAME_COUNT))
+        if total > 0:
+            self.max_frames = min(self.max_frames, total)
+        self.max_side = max_side
+        self.seek = self.step >= self.fps * SEEK_MIN_GAP and self._can_seek()
+
+    def isOpened(self):
+        return self.video.isOpened()
+
+    def release(self):
+        self.video.release()
+
+    def _can_seek(self):
+        if not self.video.isOpened() or self.step >= self.max_frames:
+            return False
+        ok = self.video.set(cv2.CAP_PROP_POS_FRAMES, self.step)
+        ok = ok and int(self.video.get(cv2.CAP_PROP_POS_FRAMES)) == self.step
+        self.video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        return ok
+
+    def __iter__(self):
+        pos = 0
+        for target in range(0, self.max_frames, self.step):
+            if self.seek and target != pos:
+                self.video.set(cv2.CAP_PROP_POS_FRAMES, target) # decoder restarts from the nearest keyframe
+                pos = target
+            while pos < target:
+                if not self.video.grab():
+                    return
+                pos += 1
+            ret, frame = self.video.read()
+            if not ret:
+                return
+            pos += 1
+            yield target, target * 1000 / self.fps, fit_frame(frame, self.max_side)
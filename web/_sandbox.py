@@ -0,0 +1,223 @@
+import asyncio
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import uuid
+
+from autogen_core import CancellationToken
+from autogen_core.code_executor import CodeBlock, CodeExecutor, CodeResult
+from autogen_core.code_executor._func_with_reqs import build_python_functions_file
+
+from _trace import tracer
+
+# Feature_Extractor scripts run in a few long-lived sandbox_worker.py processes (numpy already imported)
+# instead of one cold `python` per script; each call runs in its session's work dir, a hung or runaway
+# script gets its worker killed and replaced.
+# Scripts share their worker's interpreter, so whatever global state one changes (numpy print options, monkeypatched
+# modules, leaked threads) is seen by the next scripts on that worker, whichever session they belong to; a worker is
+# retired after SANDBOX_MAX_JOBS scripts to bound how long that lasts, it is not isolation between sessions
+
+SANDBOX_WORKERS = int(os.getenv("AURA_SANDBOX_WORKERS", 2))
+SANDBOX_MEM_MB = int(os.getenv("AURA_SANDBOX_MEM_MB", 2048)) # address space per worker, POSIX only
+SANDBOX_TIMEOUT = 60 # seconds per script unless the spec says otherwise
+MAX_OUTPUT = 20000 # characters of script output handed back to the agent
+SANDBOX_MAX_JOBS = int(os.getenv("AURA_SANDBOX_MAX_JOBS", 20)) # scripts per worker before it is replaced by a fresh one
+# one BLAS / OpenMP thread per worker: every thread reserves its own buffers, which eats the address space limit
+WORKER_ENV = {"OPENBLAS_NUM_THREADS": "1", "OMP_NUM_THREADS": "1", "MKL_NUM_THREADS": "1"}
+
+class _Worker(object):
+    def __init__(self, mem_mb, max_output):
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        cmd = [sys.executable, os.path.join(current_dir, "sandbox_worker.py"), "--mem-mb", str(mem_mb), "--max-output", str(max_output)]
+        self.proc = subprocess.Popen(cmd, cwd=current_dir, env={**os.environ, **WORKER_ENV}, stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE, text=True, encoding="utf-8", bufsize=1)
+        self.replies = queue.Queue()
+        self.ready = False
+        self.jobs = 0
+        threading.Thread(target=self._read, name="sandbox-reader", daemon=True).start()
+
+    def _read(self):
+        for line in self.proc.stdout:
+            try:
+                self.replies.put(json.loads(line))
+            except ValueError:
+                print(f"SandboxPool: bad line {line!r}")
+        self.replies.put(None) # exited
+
+    def wait_ready(self, timeout):
+        # numpy import, only the first call on a fresh worker waits for it
+        if self.ready:
+            return
+        msg = self.replies.get(timeout=timeout)
+        if not msg or msg.get("status") != "ready":
+            raise RuntimeError(f"sandbox worker did not start: {msg}")
+        self.ready = True
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    def kill(self):
+        if self.alive():
+            self.proc.kill()
+        self.proc.wait()
+
+class SandboxPool(object):
+    # at most `size` scripts at once, callers block for a free worker
+    def __init__(self, size=SANDBOX_WORKERS, mem_mb=SANDBOX_MEM_MB, max_output=MAX_OUTPUT):
+        print("start sandbox pool", size)
+        self.mem_mb = mem_mb
+        self.max_output = max_output
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._workers = set()
+        self._closed = False
+        for _ in range(size):
+            self._idle.put(self._spawn())
+
+    def _spawn(self):
+        worker = _Worker(self.mem_mb, self.max_output)
+        with self._lock:
+            self._workers.add(worker)
+        return worker
+
+    def _replace(self, worker):
+        worker.kill()
+        with self._lock:
+            self._workers.discard(worker)
+            if self._closed:
+                return None
+        return self._spawn()
+
+    def pending(self):
+        with self._lock:
+            return len(self._workers) - self._idle.qsize()
+
+    def run(self, code, cwd, timeout=SANDBOX_TIMEOUT, cancelled=None):
+        # -> (exit_code, output); 124 on timeout like coreutils `timeout`, the wait for a free worker counts against it
+        waited = 0.0
+        worker = None
+        while worker is None:
+            if cancelled is not None and cancelled.is_set():
+                return 1, "Cancelled"
+            if waited >= timeout:
+                return 124, f"Timeout: no free sandbox worker after {waited:.0f}s"
+            try:
+                worker = self._idle.get(timeout=0.5)
+            except queue.Empty:
+                waited += 0.5
+        job_id = uuid.uuid4().hex
+        try:
+            if not worker.alive():
+                worker = self._replace(worker)
+                if worker is None:
+                    return 1, "sandbox pool is shut down"
+            worker.wait_ready(max(timeout - waited, 0.5))
+            worker.proc.stdin.write(json.dumps({"id": job_id, "cwd": os.path.abspath(cwd), "code": code}) + "\n")
+            worker.proc.stdin.flush()
+            worker.jobs += 1
+            while True:
+                try:
+                    msg = worker.replies.get(timeout=0.5)
+                    break
+                except queue.Empty:
+                    waited += 0.5
+                    if waited >= timeout:
+                        worker = self._replace(worker)
+                        return 124, f"Timeout: script killed after {waited:.0f}s"
+                    if cancelled is not None and cancelled.is_set():
+                        worker = self._replace(worker)
+                        return 1, "Cancelled"
+            if msg is None: # killed by the memory limit, a segfault, os._exit()
+                code_ = worker.proc.wait()
+                worker = self._replace(worker)
+                return 1, f"sandbox worker exited with {code_}"
+            if worker.jobs >= SANDBOX_MAX_JOBS: # whatever state its scripts left behind goes with it
+                worker = self._replace(worker)
+            return msg["exit_code"], msg["output"]
+        except (OSError, RuntimeError, queue.Empty) as e:
+            worker = self._replace(worker)
+            return 1, f"sandbox error: {e}"
+        finally:
+            if worker is not None:
+                self._idle.put(worker)
+
+    def shutdown(self):
+        print("del sandbox pool")
+        with self._lock:
+            self._closed = True
+            workers = list(self._workers)
+        for worker in workers:
+            try:
+                worker.proc.stdin.close()
+            except OSError:
+                pass
+        for worker in workers:
+            try:
+                worker.proc.wait(5)
+            except subprocess.TimeoutExpired:
+                worker.kill()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_sandbox_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SandboxPool()
+        return _pool
+
+def shutdown_sandbox():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
+
+class WarmCodeExecutor(CodeExecutor):
+    # drop-in for LocalCommandLineCodeExecutor in PythonCodeExecutionTool: python blocks only, run on the shared pool
+    def __init__(self, work_dir=".coding", timeout=SANDBOX_TIMEOUT, functions_module="functions", functions=()):
+        self.work_dir = os.path.abspath(work_dir)
+        self.timeout = timeout
+        self.functions_module = functions_module
+        self.functions = list(functions)
+        self._functions_ready = False
+
+    def _setup_functions(self):
+        os.makedirs(self.work_dir, exist_ok=True)
+        if self.functions:
+            with open(os.path.join(self.work_dir, f"{self.functions_module}.py"), "w", encoding="utf-8") as f:
+                f.write(build_python_functions_file(self.functions))
+        self._functions_ready = True
+
+    async def execute_code_blocks(self, code_blocks: list[CodeBlock], cancellation_token: CancellationToken) -> CodeResult:
+        if not self._functions_ready:
+            self._setup_functions()
+        pool = get_sandbox_pool()
+        loop = asyncio.get_running_loop()
+        outputs = []
+        exit_code = 0
+        for block in code_blocks:
+            if block.language.lower() not in ("python", "py", "python3", ""):
+                return CodeResult(exit_code=1, output=f"unsupported language {block.language}, only python runs here")
+            cancelled = threading.Event()
+            cancellation_token.add_callback(cancelled.set)
+            with tracer.span("code_execution", chars=len(block.code)) as info:
+                exit_code, output = await loop.run_in_executor(None, pool.run, block.code, self.work_dir, self.timeout, cancelled)
+                info["exit_code"] = exit_code
+            outputs.append(output)
+            if exit_code != 0:
+                break
+        return CodeResult(exit_code=exit_code, output="".join(outputs))
+
+    async def start(self) -> None:
+        pass # the pool is shared and started on first use
+
+    async def stop(self) -> None:
+        pass
+
+    async def restart(self) -> None:
+        self._functions_ready = False
@@ -0,0 +1,185 @@
+import os
+import shutil
+import threading
+import time
+import uuid
+
+from _events import EventBroker
+
+IDLE, CAPTURING, ANALYZING, DONE, EXTRACTING = 0, 1, 2, 3, 10
+BUSY_STATES = (CAPTURING, ANALYZING, EXTRACTING)
+
+def _link_reference(work_dir, reference_dir):
+    # generated scripts read reference/ relative to the executor's work dir
+    link = os.path.join(work_dir, "reference")
+    if os.path.exists(link):
+        return
+    try:
+        os.symlink(os.path.abspath(reference_dir), link, target_is_directory=True)
+    except (OSError, NotImplementedError): # windows without symlink privilege
+        shutil.copytree(reference_dir, link)
+
+class Session(object):
+    # everything one user's capture and analysis touches: frames, landmarks, verdicts, events and working files
+    def __init__(self, sid, capture_root, work_root, reference_dir, judges):
+        self.id = sid
+        self.state = IDLE
+        self.start_time = None
+        self.last_saved_time = None
+        self.batch = None
+        self.live = None # live.LiveAnalyzer of the current capture
+        self.landmark_dict = {} # frame idx -> (33, 4) float32 or None
+        self.timestamp_dict = {}
+        self.frames = {} # frame idx -> jpeg bytes, the disk copy is optional
+        self.renders = {} # (frame idx, img_type) -> (etag, jpeg bytes)
+        self.generation = 0 # bumped on every new capture, result image urls carry it
+        self.suggestion = []
+        self.modified_skel = {}
+        self.modified_version = 0 # bumped whenever an ideal pose changes, sheet urls carry it
+        self.preferences = {i: 1 for i in judges}
+        self.broker = EventBroker()
+        self.tasks = []
+        self.closed = False
+        self.last_active = time.time()
+
+        self.capture_dir = os.path.join(capture_root, sid)
+        self.work_dir = os.path.join(work_root, sid)
+        os.makedirs(self.capture_dir, exist_ok=True)
+        os.makedirs(self.work_dir, exist_ok=True)
+        if os.path.isdir(reference_dir):
+            _link_reference(self.work_dir, reference_dir)
+
+    @property
+    def busy(self):
+        me = threading.current_thread()
+        return self.state in BUSY_STATES or any(t.is_alive() for t in self.tasks if t is not me)
+
+    def frame_path(self, idx):
+        return os.path.join(self.capture_dir, f"frame_{idx}.jpg")
+
+    def frame_file(self, idx):
+        # for tools that need a path, written from memory when persistence is off
+        path = self.frame_path(idx)
+        data = self.frames.get(idx)
+        if not os.path.exists(path) and data is not None:
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return path if os.path.exists(path) else None
+
+    def set_modified(self, idx, landmarks):
+        self.modified_skel[idx] = landmarks
+        self.modified_version += 1
+        for key in [k for k in list(self.renders) if k[0] == idx]: # snapshot, request threads add renders meanwhile
+            self.renders.pop(key, None)
+
+    def status(self):
+        return {
+            "state": self.state,
+            "suggestion": self.suggestion,
+            "total_frames": len(self.landmark_dict),
+            "generation": self.generation
+        }
+
+    def set_state(self, new_state):
+        self.state = new_state
+        self.broker.publish("state", self.status())
+
+    def reset(self):
+        self.landmark_dict.clear()
+        self.timestamp_dict.clear()
+        self.frames.clear()
+        self.renders.clear()
+        self.generation += 1
+        self.suggestion = []
+        self.modified_skel.clear()
+        self.modified_version = 0
+        self.live = None
+        self.broker.reset()
+        self.tasks = [t for t in self.tasks if t.is_alive()]
+        for name in os.listdir(self.capture_dir):
+            if name.startswith(("frame_", "edit_")):
+                os.remove(os.path.join(self.capture_dir, name))
+
+    def spawn(self, target, *args):
+        t = threading.Thread(target=target, args=(self, *args), daemon=True)
+        self.tasks.append(t)
+        t.start()
+        return t
+
+    def cleanup(self):
+        shutil.rmtree(self.capture_dir, ignore_errors=True)
+        link = os.path.join(self.work_dir, "reference")
+        if os.path.islink(link):
+            os.unlink(link) # rmtree would not follow it, but be explicit about never touching the shared references
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+class SessionManager(object):
+    def __init__(self, capture_root, work_root, reference_dir, judges,
+                 max_sessions=32, max_analyses=2, ttl=3600, on_close=None):
+        self.capture_root = capture_root
+        self.work_root = work_root
+        self.reference_dir = reference_dir
+        self.judges = judges
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.on_close = on_close
+        self.analysis_slots = threading.BoundedSemaphore(max_analyses) # analyses past this limit wait their turn
+        self._lock = threading.Lock()
+        self._sessions = {}
+
+    def create(self):
+        with self._lock:
+            self._prune(time.time() - self.ttl)
+            if len(self._sessions) >= self.max_sessions: # full, a user still reading results is not evicted for a newcomer
+                return None
+            sid = uuid.uuid4().hex
+            session = Session(sid, self.capture_root, self.work_root, self.reference_dir, self.judges)
+            self._sessions[sid] = session
+        print(f"session {sid} created ({len(self._sessions)} active)")
+        return session
+
+    def get(self, sid):
+        with self._lock:
+            session = self._sessions.get(sid)
+        if session is not None:
+            session.last_active = time.time()
+        return session
+
+    def close(self, sid):
+        with self._lock:
+            session = self._sessions.pop(sid, None)
+        if session is not None:
+            self._close(session)
+        return session
+
+    def finish(self, session):
+        # called by a session's last task, cleans up if the user closed it in the meantime
+        if session.closed and not session.busy:
+            self._cleanup(session)
+
+    def _prune(self, cutoff):
+        for sid, session in list(self._sessions.items()):
+            if session.last_active < cutoff and not session.busy:
+                del self._sessions[sid]
+                self._close(session)
+
+    def _close(self, session):
+        session.closed = True
+        session.broker.close()
+        if not session.busy:
+            self._cleanup(session)
+
+    def _cleanup(self, session):
+        print(f"session {session.id} closed")
+        if self.on_close:
+            self.on_close(session)
+        session.cleanup()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def sessions(self):
+        with self._lock:
+            return list(self._sessions.values())
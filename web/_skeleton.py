@@ -1,46 +1,117 @@
+import io
+import os
+import tempfile
 import cv2
+import numpy as np
+
+CONNECTIONS = np.array([
+    (11, 12), (23, 24), (11, 23), (12, 24),
+    (11, 13), (13, 15), (12, 14), (14, 16),
+    (23, 25), (25, 27), (24, 26), (26, 28)
+])
+THEMES = { # (line, joint) BGR
+    "default": ((255, 191, 0), (255, 255, 255)),
+    "ideal": ((100, 255, 100), (200, 255, 200)),
+}
+VIS_MIN = 0.3
+N_LANDMARKS = 33
+
+def to_array(landmarks):
+    # (33, 4) [x, y, z, visibility] from a PoseSequence row, a list of dicts or mediapipe landmarks, NaN for None
+    if landmarks is None:
+        return np.full((N_LANDMARKS, 4), np.nan, np.float32)
+    if isinstance(landmarks, np.ndarray):
+        return landmarks
+    if landmarks and isinstance(landmarks[0], dict):
+        return np.array([(lm['x'], lm['y'], lm.get('z', 0.0), lm.get('visibility', 1.0)) for lm in landmarks], np.float32)
+    return np.array([(lm.x, lm.y, getattr(lm, 'z', 0.0), getattr(lm, 'visibility', 1.0)) for lm in landmarks], np.float32)
+
+def project(data, w, h):
+    # (..., 33, 4) normalized -> (..., 33, 2) int32 pixels and (..., 33) visible mask, all frames at once
+    data = np.asarray(data, dtype=np.float32)
+    visible = data[..., 3] > VIS_MIN # NaN rows compare False
+    pts = np.nan_to_num(data[..., :2] * np.array([w, h], np.float32)).astype(np.int32)
+    return pts, visible
+
+def _draw(img, pts, visible, color_theme):
+    c_line, c_joint = THEMES.get(color_theme, THEMES["default"])
+
+    ok = visible[CONNECTIONS].all(axis=1)
+    if ok.any():
+        cv2.polylines(img, list(pts[CONNECTIONS[ok]]), False, c_line, 3, cv2.LINE_AA)
+
+    for x, y in pts[visible]:
+        cv2.circle(img, (int(x), int(y)), 5, c_joint, -1, cv2.LINE_AA)
+
+    if visible[0]:
+        cv2.circle(img, (int(pts[0, 0]), int(pts[0, 1])), 15, c_line, 2, cv2.LINE_AA)
+    return img
 
 def draw_skeleton(img, landmarks, color_theme="default"):
     h, w, _ = img.shape
-    pts = {}
-    
-    for i, lm in enumerate(landmarks):
-        if isinstance(lm, dict):
-            x, y = lm['x'], lm['y']
-            vis = lm.get('visibility', 1.0)
-        else:
-            x, y = lm.x, lm.y
-            vis = getattr(lm, 'visibility', 1.0)
-        
-        if vis > 0.3: 
-            pts[i] = (int(x * w), int(y * h))
-
-    if color_theme == "ideal":
-        c_line = (100, 255, 100) 
-        c_joint = (200, 255, 200)
+    pts, visible = project(to_array(landmarks), w, h)
+    return _draw(img, pts, visible, color_theme)
+
+def _label(img, text):
+    cv2.putText(img, text, (10, img.shape[0] // 2), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (100, 100, 100), 1, cv2.LINE_AA)
+    return img
+
+def draw_hints(img, hints):
+    # live coaching lines, bottom left on a dark box so they read on any background
+    h = img.shape[0]
+    for i, text in enumerate(reversed(hints)):
+        (tw, th), base = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2)
+        y = h - 20 - i * (th + base + 14)
+        cv2.rectangle(img, (10, y - th - 8), (30 + tw, y + base + 4), (0, 0, 0), -1)
+        cv2.putText(img, text, (20, y), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (80, 220, 255), 2, cv2.LINE_AA)
+    return img
+
+def composite(frame, landmarks=None, ideal=None, cell_width=None):
+    # one row: original | skeleton | ideal, optionally scaled to cell_width per cell
+    if cell_width and frame.shape[1] != cell_width:
+        frame = cv2.resize(frame, (cell_width, round(frame.shape[0] * cell_width / frame.shape[1])), interpolation=cv2.INTER_AREA)
+    h, w = frame.shape[:2]
+    row = np.zeros((h, 3 * w, 3), np.uint8)
+    row[:, :w] = frame
+    row[:, w:2 * w] = frame
+    if landmarks is None:
+        _label(row[:, w:2 * w], "No Data")
+    else:
+        pts, visible = project(landmarks, w, h)
+        _draw(row[:, w:2 * w], pts, visible, "default")
+    if ideal is None:
+        _label(row[:, 2 * w:], "Waiting or No Data")
     else:
-        c_line = (255, 191, 0) 
-        c_joint = (255, 255, 255)
-
-    def draw_line(p1, p2, color):
-        if p1 in pts and p2 in pts:
-            cv2.line(img, pts[p1], pts[p2], color, 3, cv2.LINE_AA)
-
-    def draw_joint(idx, color):
-        if idx in pts:
-            cv2.circle(img, pts[idx], 5, color, -1, cv2.LINE_AA)
-
-    connections = [
-        (11, 12), (23, 24), (11, 23), (12, 24), 
-        (11, 13), (13, 15), (12, 14), (14, 16), 
-        (23, 25), (25, 27), (24, 26), (26, 28)  
-    ]
-    
-    for p1, p2 in connections:
-        draw_line(p1, p2, c_line)
-
-    for idx in pts:
-        draw_joint(idx, c_joint)
-
-    if 0 in pts:
-        cv2.circle(img, pts[0], 15, c_line, 2, cv2.LINE_AA)
\ No newline at end of file
+        pts, visible = project(ideal, w, h)
+        _draw(row[:, 2 * w:], pts, visible, "ideal")
+    return row
+
+def contact_sheet(frames, landmarks, ideal=None, cell_width=320):
+    # every frame as one composite row, stacked top to bottom so the page can crop cells out of one image
+    ideal = ideal if ideal is not None else [None] * len(frames)
+    rows = [composite(f, lm, idl, cell_width) for f, lm, idl in zip(frames, landmarks, ideal)]
+    width = rows[0].shape[1]
+    rows = [r if r.shape[1] == width else cv2.resize(r, (width, r.shape[0] * width // r.shape[1])) for r in rows]
+    return np.vstack(rows)
+
+def encode_animation(images, fps=1.0, fmt="gif"):
+    # gif through pillow, mp4 through cv2.VideoWriter (needs a file)
+    if fmt == "gif":
+        from PIL import Image
+        buf = io.BytesIO()
+        pil = [Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB)) for img in images]
+        pil[0].save(buf, format="GIF", save_all=True, append_images=pil[1:], duration=int(1000 / fps), loop=0)
+        return buf.getvalue()
+
+    h, w = images[0].shape[:2]
+    fd, path = tempfile.mkstemp(suffix=".mp4")
+    os.close(fd)
+    try:
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+        for img in images:
+            writer.write(img if img.shape[:2] == (h, w) else cv2.resize(img, (w, h)))
+        writer.release()
+        with open(path, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(path)
@@ -0,0 +1,136 @@
+import bisect
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# in-process stage timings: prometheus histograms for /metrics and a short timeline per session for /session/<sid>/timeline
+# the session a span belongs to comes from bind(), which follows asyncio tasks but has to be set again in each thread
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+TIMELINE_MAX = 2000 # events kept per session
+
+_session = ContextVar("trace_session", default=None)
+
+def _escape(v):
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(labels):
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+
+class _Histogram(object):
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class Tracer(object):
+    def __init__(self, prefix="aura"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._hist = {} # (stage, agent) -> _Histogram
+        self._tokens = {} # (agent, kind) -> count
+        self._gauges = {} # name -> (fn, help)
+        self._timelines = {} # session id -> deque of events
+
+    @contextmanager
+    def bind(self, session):
+        token = _session.set(session)
+        try:
+            yield
+        finally:
+            _session.reset(token)
+
+    def current(self):
+        return _session.get()
+
+    @contextmanager
+    def span(self, stage, session=None, agent=None, **info):
+        start = time.time()
+        try:
+            yield info # the block may add details for the timeline
+        except BaseException as e:
+            info["error"] = type(e).__name__
+            raise
+        finally:
+            self.record(stage, start, time.time(), session, agent, **info)
+
+    def record(self, stage, start, end, session=None, agent=None, **info):
+        # a span measured elsewhere, start and end in time.time() seconds
+        session = session if session is not None else _session.get()
+        duration = max(end - start, 0.0)
+        with self._lock:
+            hist = self._hist.get((stage, agent))
+            if hist is None:
+                hist = self._hist[(stage, agent)] = _Histogram()
+            hist.observe(duration)
+            if session is not None:
+                event = {"stage": stage, "start": round(start, 3), "duration": round(duration, 4)}
+                if agent is not None:
+                    event["agent"] = agent
+                event.update(info)
+                timeline = self._timelines.get(session)
+                if timeline is None:
+                    timeline = self._timelines[session] = deque(maxlen=TIMELINE_MAX)
+                timeline.append(event)
+
+    def add_tokens(self, agent, prompt=0, completion=0):
+        with self._lock:
+            for kind, n in (("prompt", prompt), ("completion", completion)):
+                if n:
+                    self._tokens[(agent, kind)] = self._tokens.get((agent, kind), 0) + n
+
+    def gauge(self, name, fn, help=""):
+        # fn() is read at scrape time, e.g. a queue length
+        with self._lock:
+            self._gauges[name] = (fn, help)
+
+    def timeline(self, session):
+        with self._lock:
+            return list(self._timelines.get(session, ()))
+
+    def drop(self, session):
+        with self._lock:
+            self._timelines.pop(session, None)
+
+    def render(self):
+        # prometheus text exposition format 0.0.4
+        p = self.prefix
+        with self._lock:
+            hist = [(k, list(h.counts), h.sum, h.count) for k, h in sorted(self._hist.items(), key=lambda i: (i[0][0], i[0][1] or ""))]
+            tokens = sorted(self._tokens.items())
+            gauges = list(self._gauges.items())
+
+        lines = [f"# HELP {p}_stage_seconds Time spent in each pipeline stage.", f"# TYPE {p}_stage_seconds histogram"]
+        for (stage, agent), counts, total, count in hist:
+            labels = [("stage", stage)] + ([("agent", agent)] if agent is not None else [])
+            cumulative = 0
+            for le, n in zip(BUCKETS, counts):
+                cumulative += n
+                lines.append(f"{p}_stage_seconds_bucket{{{_labels(labels + [('le', le)])}}} {cumulative}")
+            lines.append(f"{p}_stage_seconds_bucket{{{_labels(labels + [('le', '+Inf')])}}} {count}")
+            lines.append(f"{p}_stage_seconds_sum{{{_labels(labels)}}} {total:.6f}")
+            lines.append(f"{p}_stage_seconds_count{{{_labels(labels)}}} {count}")
+
+        lines += [f"# HELP {p}_llm_tokens_total Model tokens used, by agent.", f"# TYPE {p}_llm_tokens_total counter"]
+        for (agent, kind), n in tokens:
+            lines.append(f"{p}_llm_tokens_total{{{_labels([('agent', agent), ('kind', kind)])}}} {n}")
+
+        for name, (fn, help) in gauges:
+            try:
+                value = float(fn())
+            except Exception as e:
+                print(f"gauge {name} Error: {e}")
+                continue
+            lines += [f"# HELP {p}_{name} {help}", f"# TYPE {p}_{name} gauge", f"{p}_{name} {value:g}"]
+        return "\n".join(lines) + "\n"
+
+tracer = Tracer()
@@ -1,15 +1,21 @@
 import json
 import os
+import threading
+from functools import lru_cache
 
 from autogen_agentchat.agents import AssistantAgent
 from autogen_ext.models.openai import OpenAIChatCompletionClient
-from autogen_core.model_context import UnboundedChatCompletionContext
+from scheduler import LimitedChatCompletionClient
+from autogen_core.model_context import ChatCompletionContext, HeadAndTailChatCompletionContext
 
 from autogen_ext.tools.code_execution import PythonCodeExecutionTool
 from autogen_ext.code_executors.local import LocalCommandLineCodeExecutor
+from _sandbox import WarmCodeExecutor
 
 from dotenv import load_dotenv, find_dotenv
 
+from coding_functions import EXECUTOR_FUNCTIONS
+
 from autogen_core.models import ModelInfo
 
 load_dotenv(find_dotenv())
@@ -22,23 +28,88 @@ custom_model_info = ModelInfo(
     structured_output=True
 )
 
-def load_agent_from_json(path: str) -> AssistantAgent:
+# clients, executors and specs are shared by every analysis; only the agent and its model context are per session
+CONTEXT_TAIL = 8 # messages kept after the task when a spec has no model_context
+
+_pool_lock = threading.Lock()
+_clients = {}
+_code_tools = {}
+
+@lru_cache(maxsize=None)
+def _load_spec(path: str) -> dict:
     with open(path, "r", encoding="utf-8") as f:
-        spec = json.load(f)
+        return json.load(f)
+
+def get_model_client(model: str, api_key=None) -> OpenAIChatCompletionClient:
+    # one client (and HTTP connection pool) per model, must only be used from the background event loop
+    # OPENAI_BASE_URL points every agent at another OpenAI-compatible server, e.g. bench/fake_openai.py
+    # requests are throttled and retried per client, see scheduler.ModelLimiter
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    base_url = os.getenv("OPENAI_BASE_URL") or None
+    key = (model, api_key, base_url)
+    with _pool_lock:
+        if key not in _clients:
+            _clients[key] = LimitedChatCompletionClient(
+                model=model,
+                api_key=api_key,
+                base_url=base_url,
+                model_info=custom_model_info
+            )
+        return _clients[key]
+
+# executor providers of the specs; the warm pool unless the spec still names the command line executor
+EXECUTORS = {
+    "_sandbox.WarmCodeExecutor": WarmCodeExecutor,
+    "autogen_ext.code_executors.local.LocalCommandLineCodeExecutor": LocalCommandLineCodeExecutor,
+}
+
+def get_code_tool(executor_config: dict, provider="_sandbox.WarmCodeExecutor") -> PythonCodeExecutionTool:
+    executor_class = EXECUTORS.get(provider, WarmCodeExecutor)
+    executor_args = {
+        "timeout": executor_config.get("timeout", 300),
+        "work_dir": executor_config.get("work_dir", ".coding"),
+    }
+
+    func_mod = executor_config.get("functions_module")
+    if func_mod:
+        executor_args["functions_module"] = func_mod
+        executor_args["functions"] = EXECUTOR_FUNCTIONS
+
+    key = (executor_args["timeout"], executor_args["work_dir"], func_mod, executor_class)
+    with _pool_lock:
+        if key not in _code_tools:
+            _code_tools[key] = PythonCodeExecutionTool(
+                executor=executor_class(**executor_args)
+            )
+        return _code_tools[key]
+
+def release_code_tools(work_dir):
+    # drop executors of a closed session, the shared ones keep their default work dir
+    with _pool_lock:
+        for key in [k for k in _code_tools if k[1] == work_dir]:
+            del _code_tools[key]
+
+async def close_clients():
+    with _pool_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        await client.close()
+
+def load_agent_from_json(path: str, extra_tools=None, work_dir=None, output_content_type=None) -> AssistantAgent:
+    spec = _load_spec(os.path.abspath(path))
 
     cfg = spec["config"]
 
     model_cfg = cfg["model_client"]["config"]
 
-    api_key = model_cfg.get("api_key") or os.getenv("OPENAI_API_KEY")
-
-    model_client = OpenAIChatCompletionClient(
-        model=model_cfg["model"],
-        api_key=api_key,
-        model_info=custom_model_info
-    )
+    model_client = get_model_client(model_cfg["model"], model_cfg.get("api_key"))
 
-    model_context = UnboundedChatCompletionContext()
+    # fresh per session, cheap; bounded so a long analysis does not make every turn slower
+    if "model_context" in cfg:
+        model_context = ChatCompletionContext.load_component(cfg["model_context"])
+    else:
+        model_context = HeadAndTailChatCompletionContext(head_size=1, tail_size=CONTEXT_TAIL)
 
     tools = []
     for tool_spec in cfg.get("tools", []):
@@ -47,23 +118,12 @@ def load_agent_from_json(path: str) -> AssistantAgent:
             tool_config = tool_spec.get("config", {})
             executor_wrapper = tool_config.get("executor", {})
             executor_config = executor_wrapper.get("config", {})
+            if work_dir:
+                executor_config = {**executor_config, "work_dir": work_dir}
 
-            executor_args = {
-                "timeout": executor_config.get("timeout", 300),
-                "work_dir": executor_config.get("work_dir", ".coding"),
-            }
+            tools.append(get_code_tool(executor_config, executor_wrapper.get("provider")))
 
-            func_mod = executor_config.get("functions_module")
-            if func_mod:
-                executor_args["functions_module"] = func_mod
-
-            executor = LocalCommandLineCodeExecutor(**executor_args)
-
-            tools.append(
-                PythonCodeExecutionTool(
-                    executor=executor
-                )
-            )
+    tools.extend(extra_tools or [])
 
     agent = AssistantAgent(
         name=cfg["name"],
@@ -72,9 +132,11 @@ def load_agent_from_json(path: str) -> AssistantAgent:
         model_client=model_client,
         model_context=model_context,
         tools=tools,
+        output_content_type=output_content_type,
         model_client_stream=cfg.get("model_client_stream", False),
         reflect_on_tool_use=cfg.get("reflect_on_tool_use", False),
         tool_call_summary_format=cfg.get("tool_call_summary_format", "{result}")
     )
+    agent.model_name = model_cfg["model"]
 
     return agent
\ No newline at end of file
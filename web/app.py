@@ -1,127 +1,265 @@
 from flask import Flask, render_template, Response, jsonify, request
+from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
 import cv2
 import time
 import os
 import threading
-import asyncio
 import numpy as np
 
 import json
-from _autogen import main
-from _camera import VideoCamera
-from _landmark import landmark
+from _autogen import stream, judge_roster
+from _background import BackgroundLoop
+from _session import SessionManager, IDLE, CAPTURING, ANALYZING, DONE, EXTRACTING
+from agent_loader import close_clients, release_code_tools
+from _sandbox import get_sandbox_pool, shutdown_sandbox
+from scheduler import scheduler
+from run_judge import parse_judge_output
+from merge import to_suggestion
+from live import LiveAnalyzer
+from _camera import VideoCamera, CameraBroadcaster
+from _extractor import LandmarkExtractor
+from _sampler import VideoSampler
+from _pose import PoseSequence, result_to_array
 from _skeleton import *
 
-from edit_pose import run_pose_edit
+from edit_pose import get_edit_worker
+from retarget import retarget, reference_targets, match_metrics
+from keyframes import select_keyframes
+from reference_index import load_reference_stats
+from _trace import tracer
 
 app = Flask(__name__)
 
 cap = VideoCamera()
-mp_landmark = landmark()
 
 CAPTURE_DURATION = 10
-SAVE_INTERVAL = 1
+LANDMARK_MODE = "image" # "video" tracks the pose between frames so capture can sample near the camera frame rate
+SAVE_INTERVAL = 1 if LANDMARK_MODE == "image" else 1 / 15
+EXTRACT_WORKERS = 2 if LANDMARK_MODE == "image" else 1
+EXTRACT_QUEUE = 8
+UPLOAD_MAX_SIDE = 640 # same size as the webcam frames, MediaPipe rescales to its 256px input anyway
 SAVE_DIR = "captures"
-UPLOAD_DIR = "uploads"
-PREFERENCE_FILE = "user_preferences.json"
-
-state = 0
-start_time = None
-last_saved_time = None
-image_cnt = 0
-done_cnt = 0
-landmark_dict = {}
-suggestion = []
-modified_skel = {}
+WORK_DIR = ".coding"
+MAX_SESSIONS = int(os.getenv("AURA_MAX_SESSIONS", 32))
+MAX_ANALYSES = int(os.getenv("AURA_MAX_ANALYSES", 2)) # analyses running at once, the rest queue
+SESSION_TTL = 3600 # idle seconds before a session and its files are dropped
+PERSIST_CAPTURES = os.getenv("AURA_PERSIST_CAPTURES", "0") == "1" # frames live in memory, disk copies are optional
+RESULT_MAX_AGE = 24 * 3600 # sheet and animation urls carry the ideal poses' version, per-frame images are revalidated
+PHOTOREAL_EDIT = os.getenv("AURA_PHOTOREAL_EDIT", "0") == "1" # ideal poses come from retarget.py, diffusion only on request
+KEYFRAME_BUDGET = 4 # frames sent to the diffusion editor
+JUDGE_KEYFRAMES = 30 # frames written to the judges' landmarks.json, their built-in metrics cover the whole capture; a 10 s capture in "image" mode has 10
+
 judges=["Steve Jobs","Donald Trump"] # should enable user judge later
+judge_ids = {judge["target_figure"]: judge["id"] for judge in judge_roster}
 
 os.makedirs(SAVE_DIR, exist_ok=True)
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-with open(PREFERENCE_FILE,'w') as f: # init preference
-    preference={i:1 for i in judges}
-    json.dump(preference,f)
 
-def gen_landmark(frame, idx): 
-    global landmark_dict, done_cnt
+extractor = LandmarkExtractor(workers=EXTRACT_WORKERS, queue_size=EXTRACT_QUEUE, mode=LANDMARK_MODE)
+background = BackgroundLoop() # model clients are reused across analyses, so they all run on this loop
+
+def on_session_close(session):
+    release_code_tools(session.work_dir)
+    tracer.drop(session.id)
+
+sessions = SessionManager(
+    SAVE_DIR, os.path.join(WORK_DIR, "sessions"), os.path.join(WORK_DIR, "reference"), judges,
+    max_sessions=MAX_SESSIONS, max_analyses=MAX_ANALYSES, ttl=SESSION_TTL,
+    on_close=on_session_close
+)
+
+persist_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="persist") if PERSIST_CAPTURES else None
+
+edit_worker = get_edit_worker() # keeps the diffusion model loaded between analyses, started on the first edit
+sandbox = get_sandbox_pool() # warm interpreters for the Feature_Extractor, started now so the first script does not wait
+
+camera_lock = threading.Lock()
+camera_session = None # the webcam feeds one capture at a time
+
+tracer.gauge("extract_queue_depth", extractor.pending, "Frames waiting for landmark detection.")
+tracer.gauge("edit_queue_depth", edit_worker.pending, "Pose edits queued or running.")
+tracer.gauge("sandbox_busy", sandbox.pending, "Sandbox workers running a script.")
+tracer.gauge("active_sessions", lambda: len(sessions), "Open sessions.")
+tracer.gauge("running_judges", lambda: scheduler.running, "Judge sessions holding a scheduler slot.")
+tracer.gauge("running_analyses", lambda: sum(s.state == ANALYZING for s in sessions.sessions()), "Sessions being judged.")
+
+def gen_landmark(session, idx, frame, ret, timestamp_ms=None):
+    hints = []
     try:
-        filename = f"{SAVE_DIR}/frame_{idx}.jpg"
-        cv2.imwrite(filename, frame)
-        
-        ret = mp_landmark.get_landmark(frame)
-        landmark_dict[idx] = ret
+        with tracer.span("gen_landmark", session.id):
+            _, jpeg = cv2.imencode('.jpg', frame)
+            session.frames[idx] = jpeg.tobytes()
+            if persist_pool:
+                persist_pool.submit(session.frame_file, idx)
+            session.timestamp_dict[idx] = timestamp_ms
+            session.landmark_dict[idx] = result_to_array(ret)
+            if session.live is not None:
+                with tracer.span("live_update", session.id):
+                    hints = session.live.add(idx, timestamp_ms, session.landmark_dict[idx])
+        session.broker.publish("state", session.status())
+        for hint in hints:
+            session.broker.publish("hint", hint)
     except Exception as e:
         print(f"gen_landmark Error: {e}")
-    finally:
-        done_cnt += 1
-
-def gen_modified_skel(idx):
-    print("modified skel:",idx)
-    global modified_skel, suggestion
-    filename = f"{SAVE_DIR}/frame_{idx}.jpg"
-    if not os.path.exists(filename):
-        print(f"gen_modified_skel: cannot find file {filename}") 
+
+def new_batch(session):
+    # the live analyzer sees every landmark result of this capture, hints while it runs and summaries for the judges
+    session.live = LiveAnalyzer({j["id"]: load_reference_stats(j["id"]) for j in judge_roster}, CAPTURE_DURATION, SAVE_INTERVAL)
+    batch = session.batch = extractor.batch(lambda *args: gen_landmark(session, *args), tag=session.id)
+    batch.done.add_done_callback(lambda done: on_landmarks_done(session, done))
+    return batch
+
+def on_landmarks_done(session, done):
+    if session.batch is None or session.batch.done is not done:
+        return # a newer capture replaced this batch
+    if session.closed:
+        session.state = IDLE
+        sessions.finish(session)
+        return
+    tracer.record("capture", session.batch.created, time.time(), session.id, frames=done.result())
+    session.set_state(ANALYZING)
+    session.spawn(gen_suggestion)
+
+def gen_ideal_skels(session):
+    # analytic fast path: the user's own poses moved onto the reference means of the top suggestion's judge
+    top = session.suggestion[0]
+    judge_id = judge_ids.get(top.get("judge"))
+    seq = PoseSequence.from_frames(session.landmark_dict, session.timestamp_dict)
+    if judge_id is None or not len(seq):
         return
-    if idx not in modified_skel:
-        modified_skel[idx]=run_pose_edit(filename, suggestion[0]["suggestion"])
-    # global landmark_dict
-    # modified_skel[idx]=landmark_dict[idx]
-    return
-
-def gen_modified_skels():
-    global done_cnt
-    for i in range(done_cnt):
-        gen_modified_skel(i)
-
-def gen_suggestion():
-    global state, suggestion, landmark_dict
-    landmark_list = [landmark_dict[i] for i in sorted(landmark_dict.keys())]
+    matched = match_metrics(top.get("suggestion", ""))
+    ref_stats = load_reference_stats(judge_id)
+    targets = reference_targets(seq.data, ref_stats, matched or None, force=matched)
+    first = next((int(i) for i in seq.frame_idx if int(i) in session.frames), None)
+    h, w = decode_frame(session, first).shape[:2] if first is not None else (1, 1) # landmarks are normalized to this frame
+    for idx, ideal in zip(seq.frame_idx, retarget(seq.data, targets, w / h)):
+        session.set_modified(int(idx), ideal)
+    print(f"ideal skeletons: {len(seq)} frames, targets {targets}")
+    session.broker.publish("modified", {"ready": session.modified_version})
+
+def gen_photoreal_skels(session):
+    # diffusion path for the keyframes only, queued at once so the edit worker can batch them, then collected in order
+    top = session.suggestion[0]
+    advice = top["suggestion"]
+    seq = PoseSequence.from_frames(session.landmark_dict, session.timestamp_dict)
+    judge_id = judge_ids.get(top.get("judge"))
+    rows = select_keyframes(seq, KEYFRAME_BUDGET, load_reference_stats(judge_id) if judge_id else None)
+    jobs = {}
+    for idx in seq.frame_idx[rows].tolist():
+        filename = session.frame_file(idx) # the edit worker reads a file
+        if filename is None:
+            print(f"gen_modified_skel: cannot find frame {idx}")
+            continue
+        jobs[idx] = edit_worker.submit(filename, advice, os.path.join(session.capture_dir, f"edit_{idx}.jpg"))
+
+    for idx, job in jobs.items():
+        if session.closed:
+            for rest in jobs.values():
+                edit_worker.cancel(rest)
+            return
+        print("modified skel:",idx)
+        try:
+            session.set_modified(idx, result_to_array(job.wait()))
+        except Exception as e:
+            print(f"gen_modified_skel Error: {e}")
+            continue
+        session.broker.publish("modified", {"ready": session.modified_version})
+
+def gen_modified_skels(session):
+    try:
+        gen_ideal_skels(session)
+    except Exception as e:
+        print(f"gen_ideal_skels Error: {e}")
+    if PHOTOREAL_EDIT:
+        gen_photoreal_skels(session)
+
+def judge_suggestions(session, label, text):
+    # partial result of a single judge, same fields as the aggregator output
+    weight = session.preferences.get(label, 1)
+    suggestions = [to_suggestion(label, v).model_dump() for v in parse_judge_output(text)]
+    for s in suggestions:
+        s["severity"] = round(s["severity"] * weight, 2)
+    return suggestions
+
+async def analyze(session, pose_seq):
+    final = None
+    with tracer.bind(session.id): # the judge tasks copy this context
+        live_metrics = session.live.summaries() if session.live is not None else None
+        async for kind, judge, content in stream(pose_seq, session.work_dir, live_metrics):
+            if kind == "judge":
+                session.broker.publish("judge", {"judge": judge.label, "suggestion": judge_suggestions(session, judge.label, content)})
+            else:
+                final = content
+    return final
+
+def judge_session(session):
+    pose_seq = PoseSequence.from_frames(session.landmark_dict, session.timestamp_dict)
     try:
-        raw_result = json.loads(asyncio.run(main(landmark_list)))
+        # the built-in metrics reach the judges as live summaries of every frame, landmarks.json only has to carry
+        # enough keyframes for their own scripts and spot checks
+        rows = select_keyframes(pose_seq, JUDGE_KEYFRAMES, [load_reference_stats(j["id"]) for j in judge_roster])
+        if len(rows) < len(pose_seq):
+            print(f"judging {len(rows)} of {len(pose_seq)} frames")
+            pose_seq = pose_seq.take(rows)
+        with tracer.span("wait_analysis_slot"):
+            sessions.analysis_slots.acquire()
+        try:
+            with tracer.span("analysis"):
+                raw_result = json.loads(background.run(analyze(session, pose_seq)))
+        finally:
+            sessions.analysis_slots.release()
         # raw_result=[{"suggestion":"Narrow steeple fingertip gap","severity":3,"description":"Steve Jobs: Your fingertips are too wide—bring the index fingertips into a tight V and reduce fingertip distance toward ~0.12–0.34, especially at the beginning and end.","judge":"Steve Jobs"},{"suggestion":"Maintain consistent hand height","severity":1,"description":"Steve Jobs: Wrists start high then drop below chest—keep hands roughly 0.09–0.30 units above shoulder height throughout, particularly mid and late.","judge":"Steve Jobs"},{"suggestion":"Soften elbow angle to ~105°","severity":2,"description":"Steve Jobs: Elbows are over-extended (up to 132°); relax into a gentle ~105° bend so arms read open but not locked.","judge":"Steve Jobs"},{"suggestion":"Set hand-span to ~1.9× shoulder width","severity":3,"description":"Donald Trump: Your hand-span collapses then over-stretches—open to about 1.9× shoulder width at the start and hold that span consistently.","judge":"Donald Trump"},{"suggestion":"Hold steeple angle at 80–95°","severity":3,"description":"Donald Trump: Steeple angle is inconsistent (too sharp then too flat); form a controlled triangular steeple around 80–95° in the opening and maintain it.","judge":"Donald Trump"},{"suggestion":"Stand more upright; limit forward lean","severity":3,"description":"Donald Trump: You lean forward too much (torso angle drops below ~160°); adopt a near-vertical posture (~172°) and check mid-speech and near the close to avoid pitching forward.","judge":"Donald Trump"}]
-        with open(PREFERENCE_FILE, 'r') as f:
-            prefs = json.load(f)
-            for data in raw_result:
-                data["severity"]=round(data["severity"]*prefs[data["judge"]],2)
-        suggestion = sorted(raw_result, key=lambda x: x["severity"],reverse=True)
+        prefs = session.preferences
+        for data in raw_result:
+            data["severity"]=round(data["severity"]*prefs[data["judge"]],2)
+        session.suggestion = sorted(raw_result, key=lambda x: x["severity"],reverse=True)
 
     except Exception as e:
         print(f"gen_suggestion Error: {e}")
-        suggestion = [{
+        session.suggestion = [{
             "judge": "System",
             "suggestion": "System Error",
             "severity": 1.0,
             "description": "後端分析發生錯誤，請檢查後端日誌。"
         }]
-        
-    state = 3
-    gen_modified_skels()
 
-def gen_frames():
-    global state, start_time, last_saved_time, image_cnt, done_cnt
+    session.set_state(DONE)
+    with tracer.span("modified_skels"):
+        gen_modified_skels(session)
+    sessions.finish(session)
 
-    while True:
-        success, frame = cap.get_cam()
-        if not success: return
+def gen_suggestion(session):
+    with tracer.bind(session.id): # edit jobs and ideal skeletons land on this session's timeline
+        judge_session(session)
 
-        now = time.time()
+def capture_tick(frame, now):
+    # runs once per camera frame in the broadcaster thread
+    session = camera_session
+    if session is None or session.state != CAPTURING:
+        return
+
+    if now - session.last_saved_time >= SAVE_INTERVAL and now - session.start_time <= CAPTURE_DURATION:
+        session.last_saved_time = now
+        session.batch.submit(frame.copy(), session.batch.submitted, (now - session.start_time) * 1000)
 
-        if state == 1:
-            if now - last_saved_time >= SAVE_INTERVAL and now - start_time <= CAPTURE_DURATION:
-                last_saved_time = now
-                current_idx = image_cnt
-                image_cnt += 1
-                threading.Thread(target=gen_landmark, args=(frame.copy(), current_idx), daemon=True).start()
+    if session.live is not None: # after the copy above, the extractor gets the clean frame
+        draw_hints(frame, session.live.active_hints(now))
 
-            if now - start_time >= CAPTURE_DURATION:
-                state=10 # so that /upload can use
-        
-        if state == 10:
-            if done_cnt >= image_cnt:
-                state = 2
-                threading.Thread(target=gen_suggestion, daemon=True).start()
+    if now - session.start_time >= CAPTURE_DURATION:
+        session.set_state(EXTRACTING) # waiting for the extractor, on_landmarks_done moves to 2
+        session.batch.seal()
 
-        ret, jpeg = cv2.imencode('.jpg', frame)
-        yield (b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + jpeg.tobytes() + b"\r\n")
+camera = CameraBroadcaster(cap, on_frame=capture_tick)
+
+def with_session(view):
+    @wraps(view)
+    def wrapper(sid, *args, **kwargs):
+        session = sessions.get(sid)
+        if session is None:
+            return jsonify({"status": "error", "message": "Unknown session"}), 404
+        return view(session, *args, **kwargs)
+    return wrapper
 
 @app.route("/")
 def index():
@@ -129,66 +267,105 @@ def index():
 
 @app.route("/video_feed")
 def video_feed():
-    return Response(gen_frames(), mimetype="multipart/x-mixed-replace; boundary=frame")
-
-@app.route("/status")
-def status():
-    return {
-        "state": state,
-        "suggestion": suggestion,
-        "total_frames": len(landmark_dict)
-    }
-
-@app.route("/update_preferences", methods=["POST"])
-def update_preferences():
-    from flask import request
+    return Response(camera.subscribe(), mimetype="multipart/x-mixed-replace; boundary=frame")
+
+@app.route("/session", methods=["POST"])
+def create_session():
+    session = sessions.create()
+    if session is None:
+        return jsonify({"status": "error", "message": "Too many active sessions"}), 503
+    return jsonify({"session_id": session.id})
+
+@app.route("/session/<sid>/close", methods=["POST"])
+def close_session(sid):
+    global camera_session
+    session = sessions.get(sid)
+    if session is None:
+        return jsonify({"status": "error", "message": "Unknown session"}), 404
+    with camera_lock:
+        if camera_session is session:
+            camera_session = None
+    if session.state == CAPTURING: # the camera stops feeding it, let the extractor drain what it has
+        session.state = EXTRACTING
+        session.batch.seal()
+    sessions.close(sid)
+    return jsonify({"status": "closed"})
+
+@app.route("/session/<sid>/status")
+@with_session
+def status(session):
+    return session.status()
+
+@app.route("/session/<sid>/events")
+@with_session
+def events(session):
+    return Response(session.broker.subscribe(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.route("/session/<sid>/timeline")
+@with_session
+def timeline(session):
+    # stage spans of this session in start order, times in epoch seconds
+    return jsonify({"session_id": session.id, "events": sorted(tracer.timeline(session.id), key=lambda e: e["start"])})
+
+@app.route("/metrics")
+def metrics():
+    return Response(tracer.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/session/<sid>/update_preferences", methods=["POST"])
+@with_session
+def update_preferences(session):
     try:
         data = request.json
         if not isinstance(data, list):
             return jsonify({"status": "error", "message": "Invalid format"}), 400
-            
-        with open(PREFERENCE_FILE, 'w') as f:
-            json.dump(data, f)
-            
+
+        session.preferences = data
+
         return jsonify({"status": "success"})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
-@app.route("/start_capture", methods=["POST"])
-def start_capture():
-    global state, start_time, last_saved_time, image_cnt, landmark_dict, done_cnt, suggestion, modified_skel
-    landmark_dict.clear()
-    state = 1
-    suggestion = []
-    modified_skel.clear()
-    start_time = time.time()
-    last_saved_time = start_time - SAVE_INTERVAL
-    image_cnt = 0
-    done_cnt = 0
+@app.route("/session/<sid>/start_capture", methods=["POST"])
+@with_session
+def start_capture(session):
+    global camera_session
+    if session.busy:
+        return jsonify({"status": "error", "message": "Session is busy"}), 409
+    with camera_lock:
+        if camera_session is not None and camera_session is not session and camera_session.state == CAPTURING:
+            return jsonify({"status": "error", "message": "Camera is in use"}), 409
+        session.reset()
+        session.start_time = time.time()
+        session.last_saved_time = session.start_time - SAVE_INTERVAL
+        new_batch(session)
+        session.set_state(CAPTURING)
+        camera_session = session
     return jsonify({"status": "started"})
 
-@app.route("/result_image/<img_type>/<int:frame_idx>")
-def get_result_image(img_type, frame_idx):
-    global landmark_dict, modified_skel
-    
-    filename = f"{SAVE_DIR}/frame_{frame_idx}.jpg"
-    if not os.path.exists(filename):
-        blank = np.zeros((480, 640, 3), np.uint8)
-        _, img_encoded = cv2.imencode('.jpg', blank)
-        return Response(img_encoded.tobytes(), mimetype='image/jpeg')
-        
-    original_img = cv2.imread(filename)
-    h, w, _ = original_img.shape
+SHEET_CELL_WIDTH = 320 # px per cell of the contact sheet and the animation
+
+def decode_frame(session, frame_idx):
+    return cv2.imdecode(np.frombuffer(session.frames[frame_idx], np.uint8), cv2.IMREAD_COLOR)
+
+def encode_jpeg(img):
+    _, img_encoded = cv2.imencode('.jpg', img)
+    return img_encoded.tobytes()
 
+def render_result(session, img_type, frame_idx):
+    # jpeg bytes, or None while the image is only a placeholder
+    if frame_idx not in session.frames:
+        return None
     if img_type == "original":
-        _, img_encoded = cv2.imencode('.jpg', original_img)
-        return Response(img_encoded.tobytes(), mimetype='image/jpeg')
+        return session.frames[frame_idx]
+    if img_type == "composite":
+        return encode_jpeg(composite(decode_frame(session, frame_idx), session.landmark_dict.get(frame_idx), session.modified_skel.get(frame_idx)))
 
+    original_img = decode_frame(session, frame_idx)
+    h, w, _ = original_img.shape
     black_canvas = np.zeros((h, w, 3), dtype=np.uint8)
-    
-    res = landmark_dict.get(frame_idx)
-    has_data = res
-    current_landmarks = res.pose_landmarks[0] if has_data else []
+
+    current_landmarks = session.landmark_dict.get(frame_idx)
+    has_data = current_landmarks is not None
 
     if img_type == "skeleton":
         if not has_data:
@@ -197,77 +374,133 @@ def get_result_image(img_type, frame_idx):
             draw_skeleton(original_img, current_landmarks, "default")
             black_canvas=original_img
     elif img_type == "modified":
-        if not (frame_idx in modified_skel):
-            cv2.putText(black_canvas, "Waiting or No Data", (50, h//2), cv2.FONT_HERSHEY_SIMPLEX, 1, (100,100,100), 2)
-        else:
-            ideal_landmarks = modified_skel[frame_idx].pose_landmarks[0]
-            draw_skeleton(black_canvas, ideal_landmarks, "ideal")
-
-    _, img_encoded = cv2.imencode('.jpg', black_canvas)
-    return Response(img_encoded.tobytes(), mimetype='image/jpeg')
-
-@app.route("/upd_preference", methods=["POST"])
-def upd_preference():
+        if session.modified_skel.get(frame_idx) is None:
+            return None
+        ideal_landmarks = session.modified_skel[frame_idx]
+        draw_skeleton(black_canvas, ideal_landmarks, "ideal")
+
+    return encode_jpeg(black_canvas)
+
+def session_rows(session):
+    idxs = sorted(session.frames)
+    return ([decode_frame(session, i) for i in idxs],
+            [session.landmark_dict.get(i) for i in idxs],
+            [session.modified_skel.get(i) for i in idxs])
+
+def placeholder(text=None):
+    blank = np.zeros((480, 640, 3), np.uint8)
+    if text:
+        cv2.putText(blank, text, (50, 240), cv2.FONT_HERSHEY_SIMPLEX, 1, (100,100,100), 2)
+    resp = Response(encode_jpeg(blank), mimetype='image/jpeg')
+    resp.cache_control.no_store = True
+    return resp
+
+def cached_response(session, key, render, mimetype='image/jpeg'):
+    # memoized per session, revalidated by etag; sheet / animation keys carry the ideal poses' version like their urls
+    cached = session.renders.get(key)
+    if cached is None:
+        data = render()
+        if data is None:
+            return None
+        cached = session.renders[key] = (hashlib.sha1(data).hexdigest(), data)
+        if isinstance(key[0], str): # ("sheet", version) / ("animation", fmt, version): earlier versions are never served again
+            for old in [k for k in list(session.renders) if k[:-1] == key[:-1] and k != key]:
+                session.renders.pop(old, None)
+
+    etag, data = cached
+    resp = Response(data, mimetype=mimetype)
+    resp.set_etag(etag)
+    resp.cache_control.private = True
+    if isinstance(key[0], str): # the url carries the version, it never changes under the browser
+        resp.cache_control.max_age = RESULT_MAX_AGE
+    else: # per-frame urls are unversioned and set_modified changes them, revalidate every time
+        resp.cache_control.no_cache = True
+    return resp.make_conditional(request)
+
+@app.route("/session/<sid>/result_image/<img_type>/<int:frame_idx>")
+@with_session
+def get_result_image(session, img_type, frame_idx):
+    key = (frame_idx, img_type) # dropped by set_modified when the ideal pose changes
+    resp = cached_response(session, key, lambda: render_result(session, img_type, frame_idx))
+    if resp is None:
+        return placeholder("Waiting or No Data" if img_type == "modified" and frame_idx in session.frames else None)
+    return resp
+
+@app.route("/session/<sid>/result_sheet")
+@with_session
+def get_result_sheet(session):
+    # every frame as an original | skeleton | ideal row in one jpeg
+    key = ("sheet", session.modified_version)
+    resp = cached_response(session, key, lambda: encode_jpeg(contact_sheet(*session_rows(session), SHEET_CELL_WIDTH)) if session.frames else None)
+    return resp if resp is not None else placeholder()
+
+@app.route("/session/<sid>/result_animation.<fmt>")
+@with_session
+def get_result_animation(session, fmt):
+    if fmt not in ("gif", "mp4"):
+        return jsonify({"status": "error", "message": "Unknown format"}), 404
+    key = ("animation", fmt, session.modified_version)
+    def render():
+        if not session.frames:
+            return None
+        rows = [composite(*row, SHEET_CELL_WIDTH) for row in zip(*session_rows(session))]
+        return encode_animation(rows, 1 / SAVE_INTERVAL, fmt)
+    resp = cached_response(session, key, render, mimetype="image/gif" if fmt == "gif" else "video/mp4")
+    return resp if resp is not None else placeholder()
+
+@app.route("/session/<sid>/upd_preference", methods=["POST"])
+@with_session
+def upd_preference(session):
     try:
         data = request.get_json()
         judge = data.get("judge")
         delta = data.get("delta")
 
-        with open(PREFERENCE_FILE, 'r') as f:
-            prefs = json.load(f)
+        prefs = session.preferences
 
         if judge in prefs:
             prefs[judge] = max(0, prefs[judge] + delta * 0.2) # discuss this later
 
-        with open(PREFERENCE_FILE, 'w') as f:
-            json.dump(prefs, f)
-
         return jsonify({"status": "success"})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
-@app.route("/upload", methods=["POST"])
-def upload():
-    global state, image_cnt, done_cnt
-    image_cnt = 0
-    done_cnt = 0
+@app.route("/session/<sid>/upload", methods=["POST"])
+@with_session
+def upload(session):
     file = request.files.get("file")
     if not file:
         return "No file", 400
-    
-    # Save uploaded video
-    video_path = os.path.join(UPLOAD_DIR, file.filename)
+    if session.busy:
+        return jsonify({"status": "error", "message": "Session is busy"}), 409
+
+    # Save uploaded video, removed with the session
+    video_path = os.path.join(session.capture_dir, os.path.basename(file.filename))
     file.save(video_path)
 
-    cap2 = cv2.VideoCapture(video_path)
+    cap2 = VideoSampler(video_path, SAVE_INTERVAL, CAPTURE_DURATION, UPLOAD_MAX_SIDE)
     if not cap2.isOpened():
         return "Failed to open video", 400
 
-    fps = cap2.get(cv2.CAP_PROP_FPS)
-
-    frame_interval = int(fps * SAVE_INTERVAL)
-    max_frames = int(fps * CAPTURE_DURATION)
-
-    frame_idx = 0
-    current_idx = 0
-
-    while cap2.isOpened() and frame_idx < max_frames:
-        ret, frame = cap2.read()
-        if not ret:
-            break
-
-        if frame_idx % frame_interval == 0:
-            current_idx = image_cnt
-            image_cnt+=1
-            threading.Thread(target=gen_landmark, args=(frame.copy(), current_idx), daemon=True).start()
+    session.reset()
+    upload_batch = new_batch(session)
+    session.set_state(EXTRACTING)
 
-        frame_idx += 1
+    for frame_idx, timestamp_ms, frame in cap2:
+        upload_batch.submit(frame, upload_batch.submitted, timestamp_ms) # blocks when the extractor falls behind
 
     cap2.release()
-    state = 10 # call gen_suggestion in big loop
+    upload_batch.seal() # gen_suggestion starts once the batch drains
     return {"status": "started"}
 
 if __name__ == "__main__":
     app.run(debug=True,use_reloader=False)
-    mp_landmark.shutdown()
+    camera.shutdown()
+    extractor.shutdown()
+    if persist_pool:
+        persist_pool.shutdown()
+    edit_worker.shutdown()
+    shutdown_sandbox()
+    background.run(close_clients())
+    background.shutdown()
     cap.shutdown()
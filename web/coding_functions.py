@@ -0,0 +1,26 @@
+# helpers written into the executor's functions module, each one must be self-contained (source is copied verbatim)
+
+from summarize import summarize_values
+
+def load_landmarks(name: str = "landmarks"):
+    """Memory-map `<name>.npy` as a read-only (frames, 33, 4) float32 array, last axis is [x, y, z, visibility]."""
+    import numpy as np
+    return np.load(f"{name}.npy", mmap_mode="r")
+
+def load_manifest(name: str = "landmarks") -> dict:
+    """Read `<name>.manifest.json`: shape, dtype, fields, timestamps (ms) and frame_idx of each row of the array."""
+    import json
+    with open(f"{name}.manifest.json", "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def load_references(judge: str) -> dict:
+    """Memory-map every `reference/<judge>_*.npy`, returns {file stem: (frames, 33, 4) float32 array}."""
+    import glob
+    import os
+    import numpy as np
+    refs = {}
+    for path in sorted(glob.glob(os.path.join("reference", f"{judge}_*.npy"))):
+        refs[os.path.splitext(os.path.basename(path))[0]] = np.load(path, mmap_mode="r")
+    return refs
+
+EXECUTOR_FUNCTIONS = [load_landmarks, load_manifest, load_references, summarize_values]
@@ -1,54 +1,183 @@
+import json
 import os
 import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
 import cv2
 from _landmark import landmark
+from _trace import tracer
 
+EDIT_STUB = os.getenv("AURA_EDIT_STUB", "0") == "1" # no diffusion model, the "edit" is the input frame
+EDIT_BATCH_SIZE = 4 # frames per sampler run, bounded by GPU memory
 
 def find_conda_env():
     user_home = os.path.expanduser("~")
 
     return os.path.join(user_home, "miniconda3", "envs", "ip2p", "python.exe")
 
-
-def run_pose_edit(image_path, advice, output_path="../instruct-pix2pix/imgs/output.jpg"):
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-
-    target_work_dir = os.path.abspath(os.path.join(current_dir, "../instruct-pix2pix"))
-    script_path = os.path.join(target_work_dir, "edit_cli.py")
-
-    abs_input_path = os.path.abspath(image_path)
-    abs_output_path = os.path.abspath(output_path)
-
-    conda_env = find_conda_env()
-
-    print(target_work_dir)
-
-    image_guidance = 0.15
-    text_guidance = 10.0
-    steps = 20
-
-    prompt = f"Make a single person stand facing the camera, giving a TED talk presentation, {advice}"
-
-    cmd = [
-        conda_env,
-        script_path,
-        "--input", abs_input_path,
-        "--output", abs_output_path,
-        "--edit", prompt,
-        "--cfg-image", str(image_guidance),
-        "--cfg-text", str(text_guidance),
-        "--steps", str(steps)
-    ]
-
-    subprocess.run(cmd, cwd=target_work_dir, check=True)
-
-    frame = cv2.imread(abs_output_path)
-
-    ret = landmark().get_landmark(frame)
+class EditJob(object):
+    __slots__ = ("id", "image_path", "advice", "output_path", "status", "result", "error", "created", "session", "_done")
+
+    def __init__(self, image_path, advice, output_path):
+        self.id = uuid.uuid4().hex
+        self.image_path = image_path
+        self.advice = advice
+        self.output_path = output_path
+        self.status = "queued" # queued -> running -> done | error | cancelled
+        self.result = None # PoseLandmarkerResult of the edited frame
+        self.error = None
+        self.created = time.time()
+        self.session = tracer.current() # the reader thread finishes the job outside the caller's trace context
+        self._done = threading.Event()
+
+    def finish(self, status, result=None, error=None):
+        self.status, self.result, self.error = status, result, error
+        tracer.record("pose_edit", self.created, time.time(), self.session, status=status)
+        self._done.set()
+
+    def wait(self, timeout=None):
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"edit job {self.id} still {self.status}")
+        if self.status != "done":
+            raise RuntimeError(f"edit job {self.id} {self.status}: {self.error}")
+        return self.result
+
+class EditWorker(object):
+    # keeps one ip2p_server.py process (and its loaded model) for every edit, started on the first job
+    def __init__(self, stub=EDIT_STUB, batch_size=EDIT_BATCH_SIZE, output_dir=None):
+        self.stub = stub
+        self.batch_size = batch_size
+        self.output_dir = output_dir or os.path.join(tempfile.gettempdir(), "aura_edits")
+        self._lock = threading.Lock()
+        self._jobs = {} # id -> (job, server process it was sent to)
+        self._proc = None
+        self._landmarker = None # only used by the reader thread
+
+    def _command(self):
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        server = os.path.join(current_dir, "ip2p_server.py")
+        if self.stub:
+            return [sys.executable, server, "--stub"], current_dir
+        target_work_dir = os.path.abspath(os.path.join(current_dir, "../instruct-pix2pix"))
+        return [find_conda_env(), server, "--batch-size", str(self.batch_size)], target_work_dir
+
+    def _start(self):
+        cmd, cwd = self._command()
+        print("start edit worker:", " ".join(cmd))
+        self._proc = subprocess.Popen(cmd, cwd=cwd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                      text=True, encoding="utf-8", bufsize=1)
+        threading.Thread(target=self._read, args=(self._proc,), name="edit-worker", daemon=True).start()
+
+    def _send(self, msg):
+        self._proc.stdin.write(json.dumps(msg) + "\n")
+        self._proc.stdin.flush()
+
+    def submit(self, image_path, advice, output_path=None):
+        if output_path is None:
+            os.makedirs(self.output_dir, exist_ok=True)
+            output_path = os.path.join(self.output_dir, f"edit_{uuid.uuid4().hex}.jpg")
+        job = EditJob(image_path, advice, output_path)
+
+        image_guidance = 0.15
+        text_guidance = 10.0
+        steps = 20
+
+        prompt = f"Make a single person stand facing the camera, giving a TED talk presentation, {advice}"
+
+        with self._lock:
+            if self._proc is None or self._proc.poll() is not None:
+                self._start()
+            self._jobs[job.id] = (job, self._proc)
+            self._send({
+                "id": job.id,
+                "input": os.path.abspath(image_path),
+                "output": os.path.abspath(output_path),
+                "edit": prompt,
+                "cfg_image": image_guidance,
+                "cfg_text": text_guidance,
+                "steps": steps,
+            })
+        return job
+
+    def cancel(self, job):
+        with self._lock:
+            if self._jobs.pop(job.id, None) is None:
+                return
+            if job.status == "queued" and self._proc is not None and self._proc.poll() is None:
+                self._send({"cancel": job.id})
+        job.finish("cancelled")
+
+    def status(self, job_id):
+        with self._lock:
+            job, _ = self._jobs.get(job_id, (None, None))
+        return None if job is None else {"id": job.id, "status": job.status, "error": job.error}
+
+    def pending(self):
+        with self._lock:
+            return len(self._jobs)
+
+    def _read(self, proc):
+        for line in proc.stdout:
+            try:
+                msg = json.loads(line)
+            except ValueError:
+                print(f"EditWorker: bad line {line!r}")
+                continue
+            with self._lock:
+                job, _ = self._jobs.get(msg.get("id"), (None, None))
+            if job is None:
+                continue # the ready line, or a cancelled job
+            if msg["status"] == "running":
+                job.status = "running"
+                continue
+            with self._lock:
+                self._jobs.pop(job.id, None)
+            if msg["status"] != "done":
+                job.finish("error", error=msg.get("error"))
+                continue
+            try:
+                if self._landmarker is None:
+                    self._landmarker = landmark() # one mediapipe graph for every edited frame
+                job.finish("done", result=self._landmarker.get_landmark(cv2.imread(job.output_path)))
+            except Exception as e:
+                job.finish("error", error=str(e))
+
+        with self._lock: # the server died, fail whatever it still owed us
+            lost = [job for job, owner in self._jobs.values() if owner is proc]
+            for job in lost:
+                del self._jobs[job.id]
+        for job in lost:
+            job.finish("error", error=f"edit worker exited with {proc.wait()}")
+
+    def shutdown(self):
+        with self._lock:
+            proc, self._proc = self._proc, None
+        if proc is None:
+            return
+        print("stop edit worker")
+        proc.stdin.close()
+        proc.wait()
+
+_worker = None
+_worker_lock = threading.Lock()
+
+def get_edit_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = EditWorker()
+        return _worker
+
+def run_pose_edit(image_path, advice, output_path=None):
+    # blocking single frame edit, use get_edit_worker().submit to queue several at once
+    ret = get_edit_worker().submit(image_path, advice, output_path).wait()
 
     print(ret)
 
     return ret
 
 if __name__ == "__main__":
-    result = run_pose_edit("test.jpg", "open the arms wider")
\ No newline at end of file
+    result = run_pose_edit("test.jpg", "open the arms wider")
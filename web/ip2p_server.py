@@ -0,0 +1,190 @@
+# long-running instruct-pix2pix edit server for edit_pose.EditWorker, keeps the model loaded between frames
+# run inside the ip2p env with the instruct-pix2pix checkout as cwd, or with --stub (copies the input, no model) for tests
+# stdin, one json per line: {"id", "input", "output", "edit", "cfg_text", "cfg_image", "steps", "seed"} or {"cancel": id}
+# stdout, one json per line: {"status": "ready"} once, then {"id", "status": "running" | "done" | "error", ...}
+import json
+import math
+import os
+import queue
+import random
+import shutil
+import sys
+import threading
+import time
+from argparse import ArgumentParser
+
+protocol = sys.stdout
+sys.stdout = sys.stderr # model loading prints, keep them off the protocol stream
+
+def reply(**msg):
+    protocol.write(json.dumps(msg) + "\n")
+    protocol.flush()
+
+class StubEditor(object):
+    def __init__(self, args):
+        self.delay = args.stub_delay
+
+    def edit(self, jobs):
+        for job in jobs:
+            time.sleep(self.delay)
+            shutil.copyfile(job["input"], job["output"])
+
+class Pix2PixEditor(object):
+    # same model and sampler as edit_cli.py, loaded once and run on batches of same-sized frames
+    def __init__(self, args):
+        sys.path.insert(0, os.getcwd())
+        import edit_cli # adds ./stable_diffusion to the path
+        import torch
+        import k_diffusion as K
+        from omegaconf import OmegaConf
+
+        self.torch = torch
+        self.K = K
+        self.resolution = args.resolution
+        self.model = edit_cli.load_model_from_config(OmegaConf.load(args.config), args.ckpt, args.vae_ckpt)
+        self.model.eval().cuda()
+        self.model_wrap = K.external.CompVisDenoiser(self.model)
+        self.null_token = self.model.get_learned_conditioning([""])
+        self._prompts = {}
+
+    def _denoise(self, z, sigma, cond, uncond, text_cfg_scale, image_cfg_scale):
+        # edit_cli.CFGDenoiser for a batch of n instead of 1
+        torch = self.torch
+        cfg_cond = {
+            "c_crossattn": [torch.cat([cond["c_crossattn"][0], uncond["c_crossattn"][0], uncond["c_crossattn"][0]])],
+            "c_concat": [torch.cat([cond["c_concat"][0], cond["c_concat"][0], uncond["c_concat"][0]])],
+        }
+        out_cond, out_img_cond, out_uncond = self.model_wrap(torch.cat([z] * 3), torch.cat([sigma] * 3), cond=cfg_cond).chunk(3)
+        return out_uncond + text_cfg_scale * (out_cond - out_img_cond) + image_cfg_scale * (out_img_cond - out_uncond)
+
+    def _prompt(self, text):
+        if text not in self._prompts:
+            self._prompts[text] = self.model.get_learned_conditioning([text])
+        return self._prompts[text]
+
+    def _load(self, path):
+        from PIL import Image, ImageOps
+        image = Image.open(path).convert("RGB")
+        width, height = image.size
+        factor = self.resolution / max(width, height)
+        factor = math.ceil(min(width, height) * factor / 64) * 64 / min(width, height)
+        width = int((width * factor) // 64) * 64
+        height = int((height * factor) // 64) * 64
+        return ImageOps.fit(image, (width, height), method=Image.Resampling.LANCZOS)
+
+    def edit(self, jobs):
+        import numpy as np
+        from einops import rearrange
+        from PIL import Image
+        torch = self.torch
+        first = jobs[0]
+        images = [self._load(job["input"]) for job in jobs]
+
+        with torch.no_grad(), torch.autocast("cuda"), self.model.ema_scope():
+            x = torch.stack([2 * torch.tensor(np.array(img)).float() / 255 - 1 for img in images])
+            x = rearrange(x, "n h w c -> n c h w").to(self.model.device)
+            cond = {
+                "c_crossattn": [torch.cat([self._prompt(job["edit"]) for job in jobs])],
+                "c_concat": [self.model.encode_first_stage(x).mode()],
+            }
+            uncond = {
+                "c_crossattn": [self.null_token.repeat(len(jobs), 1, 1)],
+                "c_concat": [torch.zeros_like(cond["c_concat"][0])],
+            }
+            sigmas = self.model_wrap.get_sigmas(first["steps"])
+            extra_args = {
+                "cond": cond,
+                "uncond": uncond,
+                "text_cfg_scale": first["cfg_text"],
+                "image_cfg_scale": first["cfg_image"],
+            }
+            torch.manual_seed(first.get("seed") or random.randint(0, 100000))
+            z = torch.randn_like(cond["c_concat"][0]) * sigmas[0]
+            z = self.K.sampling.sample_euler_ancestral(self._denoise, z, sigmas, extra_args=extra_args)
+            out = self.model.decode_first_stage(z)
+            out = torch.clamp((out + 1.0) / 2.0, min=0.0, max=1.0)
+            out = 255.0 * rearrange(out, "n c h w -> n h w c")
+            for job, img in zip(jobs, out.type(torch.uint8).cpu().numpy()):
+                Image.fromarray(img).save(job["output"])
+
+def batch_key(job, editor):
+    # jobs share a sampler run only if their frames, steps and guidance match
+    size = None
+    if isinstance(editor, Pix2PixEditor):
+        from PIL import Image
+        with Image.open(job["input"]) as img: # header only
+            size = img.size
+    return (size, job.get("steps"), job.get("cfg_text"), job.get("cfg_image"))
+
+def read_jobs(jobs, cancelled):
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            msg = json.loads(line)
+        except ValueError:
+            print(f"ip2p_server: bad line {line!r}")
+            continue
+        if "cancel" in msg:
+            cancelled.add(msg["cancel"])
+        else:
+            jobs.put(msg)
+    jobs.put(None) # stdin closed
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--resolution", default=512, type=int)
+    parser.add_argument("--config", default="configs/generate.yaml", type=str)
+    parser.add_argument("--ckpt", default="checkpoints/instruct-pix2pix-00-22000.ckpt", type=str)
+    parser.add_argument("--vae-ckpt", default=None, type=str)
+    parser.add_argument("--batch-size", default=4, type=int)
+    parser.add_argument("--stub", action="store_true")
+    parser.add_argument("--stub-delay", default=0.0, type=float)
+    args = parser.parse_args()
+
+    editor = StubEditor(args) if args.stub else Pix2PixEditor(args)
+
+    jobs = queue.Queue()
+    cancelled = set()
+    threading.Thread(target=read_jobs, args=(jobs, cancelled), daemon=True).start()
+    reply(status="ready")
+
+    pending = []
+    while True:
+        if not pending:
+            job = jobs.get()
+            if job is None:
+                return
+            pending.append(job)
+        while True: # whatever else is already queued joins this round
+            try:
+                job = jobs.get_nowait()
+            except queue.Empty:
+                break
+            if job is None:
+                jobs.put(None)
+                break
+            pending.append(job)
+
+        pending = [job for job in pending if job["id"] not in cancelled]
+        if not pending:
+            continue
+        key = batch_key(pending[0], editor)
+        batch = [job for job in pending if batch_key(job, editor) == key][:args.batch_size]
+        pending = [job for job in pending if job not in batch]
+
+        for job in batch:
+            reply(id=job["id"], status="running")
+        start = time.time()
+        try:
+            editor.edit(batch)
+        except Exception as e:
+            for job in batch:
+                reply(id=job["id"], status="error", error=str(e))
+            continue
+        for job in batch:
+            reply(id=job["id"], status="done", output=job["output"], seconds=round(time.time() - start, 3))
+
+if __name__ == "__main__":
+    main()
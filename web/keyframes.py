@@ -0,0 +1,81 @@
+import warnings
+import numpy as np
+
+from _pose import PoseSequence
+from metrics import METRICS, compute_metric, L_SHOULDER, R_SHOULDER, L_HIP, R_HIP, VIS_MIN
+
+# pick the K frames worth editing / judging: spread out in pose space, plus motion and metric-violation peaks
+
+BODY = list(range(0, 25)) # face, arms, hands and hips; legs are often out of frame
+MOTION_WEIGHT = 0.5
+VIOLATION_WEIGHT = 1.0
+
+def pose_features(data):
+    # (frames, 25 * 2) pose descriptor, centered on the hips and scaled by shoulder width, invisible points at 0
+    data = np.asarray(data, dtype=np.float64)
+    xy = data[:, BODY, :2]
+    hips = (data[:, L_HIP, :2] + data[:, R_HIP, :2]) / 2
+    shoulders = (data[:, L_SHOULDER, :2] + data[:, R_SHOULDER, :2]) / 2
+    center = np.where(np.isnan(hips), shoulders, hips)
+    scale = np.linalg.norm(data[:, L_SHOULDER, :2] - data[:, R_SHOULDER, :2], axis=-1)
+    scale = np.where(np.isnan(scale) | (scale < 1e-6), np.nanmedian(scale) if not np.isnan(scale).all() else 1.0, scale)
+    feats = (xy - center[:, None]) / scale[:, None, None]
+    visible = data[:, BODY, 3] >= VIS_MIN
+    return np.nan_to_num(np.where(visible[..., None], feats, 0.0)).reshape(len(data), -1)
+
+def motion_energy(feats):
+    # mean distance to the neighbouring frames
+    if len(feats) < 2:
+        return np.zeros(len(feats))
+    step = np.linalg.norm(np.diff(feats, axis=0), axis=-1)
+    return (np.concatenate([step[:1], step]) + np.concatenate([step, step[-1:]])) / 2
+
+def violation_score(data, timestamps, ref_stats):
+    # per frame: how far each metric is outside its reference range, in range widths, summed over metrics (and judges)
+    stats_list = ref_stats if isinstance(ref_stats, (list, tuple)) else [ref_stats]
+    score = np.zeros(len(data))
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        for name in METRICS:
+            values = None
+            for stats in stats_list:
+                s = (stats or {}).get(name)
+                if not s or s.get("ref_min") is None:
+                    continue
+                if values is None:
+                    values = compute_metric(name, data, timestamps)
+                span = max(s["ref_max"] - s["ref_min"], 1e-6)
+                out = np.maximum(s["ref_min"] - values, 0) + np.maximum(values - s["ref_max"], 0)
+                score += np.nan_to_num(np.minimum(out / span, 3.0)) # one wild metric must not dominate
+    return score
+
+def _unit(v):
+    v = np.asarray(v, dtype=np.float64)
+    span = v.max() - v.min() if len(v) else 0
+    return (v - v.min()) / span if span > 1e-12 else np.zeros(len(v))
+
+def select_keyframes(seq, k, ref_stats=None, motion_weight=MOTION_WEIGHT, violation_weight=VIOLATION_WEIGHT):
+    # row indices (time order) of at most k frames: farthest-point sampling in pose space,
+    # seeded with and biased towards frames that move most or break the reference ranges most
+    if not isinstance(seq, PoseSequence):
+        seq = PoseSequence(seq)
+    n = len(seq)
+    if k is None or k >= n:
+        return np.arange(n)
+    if k <= 0:
+        return np.arange(0)
+
+    feats = pose_features(seq.data)
+    score = motion_weight * _unit(motion_energy(feats))
+    if ref_stats:
+        score += violation_weight * _unit(violation_score(seq.data, seq.timestamps, ref_stats))
+
+    chosen = [int(np.argmax(score))]
+    dist = np.linalg.norm(feats - feats[chosen[0]], axis=-1)
+    for _ in range(k - 1):
+        gain = _unit(dist) + score
+        gain[chosen] = -np.inf
+        nxt = int(np.argmax(gain))
+        chosen.append(nxt)
+        dist = np.minimum(dist, np.linalg.norm(feats - feats[nxt], axis=-1))
+    return np.sort(np.array(chosen))
@@ -1,9 +1,32 @@
+import glob
 import json
 import os
+import numpy as np
 
-def save_landmarks_to_file(result_list, filename="landmarks.json", is_reference=False):
-    base_dir = ".coding"
+from _pose import PoseSequence, FIELDS
+from _trace import tracer
 
+BINARY_VERSION = 1
+
+def save_landmarks_binary(seq, file_path, manifest=True):
+    # <name>.npy is np.load(..., mmap_mode="r")-able, <name>.manifest.json describes it
+    stem = os.path.splitext(file_path)[0]
+    np.save(f"{stem}.npy", np.ascontiguousarray(seq.data, dtype=np.float32))
+    if not manifest:
+        return
+    manifest_data = {
+        "version": BINARY_VERSION,
+        "file": os.path.basename(f"{stem}.npy"),
+        "shape": list(seq.data.shape),
+        "dtype": "float32",
+        "fields": list(FIELDS),
+        "timestamps": [None if np.isnan(t) else t for t in seq.timestamps.tolist()],
+        "frame_idx": seq.frame_idx.tolist(),
+    }
+    with open(f"{stem}.manifest.json", "w", encoding='utf-8') as f:
+        json.dump(manifest_data, f)
+
+def save_landmarks_to_file(result_list, filename="landmarks.json", is_reference=False, base_dir=".coding"):
     if is_reference:
         target_dir = os.path.join(base_dir, "reference")
     else:
@@ -13,21 +36,21 @@ def save_landmarks_to_file(result_list, filename="landmarks.json", is_reference=
 
     file_path = os.path.join(target_dir, filename)
 
-    simplified_data = []
-    for result in result_list:
-        if result and hasattr(result, 'pose_landmarks'):
-            for frame in result.pose_landmarks:
-                frame_points = []
-                for p in frame:
-                    frame_points.append({
-                        "x": p.x,
-                        "y": p.y,
-                        "z": p.z,
-                        "visibility": getattr(p, 'visibility', 0.0)
-                    })
-                simplified_data.append(frame_points)
-
-    with open(file_path, "w", encoding='utf-8') as f:
-        json.dump(simplified_data, f)
-
-    print(f"Data saved to: {file_path}")
\ No newline at end of file
+    if not isinstance(result_list, PoseSequence): # raw PoseLandmarkerResult list
+        result_list = PoseSequence.from_results(result_list)
+
+    with tracer.span("save_landmarks", frames=len(result_list)):
+        with open(file_path, "w", encoding='utf-8') as f:
+            json.dump(result_list.to_list(), f)
+        save_landmarks_binary(result_list, file_path, manifest=not is_reference)
+
+    print(f"Data saved to: {file_path}")
+
+def convert_reference_dir(base_dir=".coding"):
+    # reference/*.json -> .npy once, redone only when the json is newer
+    # no manifest here, generated scripts glob reference/<judge>_*.json
+    for path in glob.glob(os.path.join(base_dir, "reference", "*.json")):
+        stem = os.path.splitext(path)[0]
+        if os.path.exists(f"{stem}.npy") and os.path.getmtime(f"{stem}.npy") >= os.path.getmtime(path):
+            continue
+        save_landmarks_binary(PoseSequence.from_json(path), path, manifest=False)
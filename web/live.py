@@ -0,0 +1,168 @@
+import threading
+import time
+import warnings
+
+import numpy as np
+
+from metrics import METRICS, compute_metric
+from summarize import TREND_POINTS, digits_for
+
+# running statistics of a capture, updated frame by frame as landmarks come in and in fixed memory per metric:
+# mean, min/max, a time-bucketed trend, a reservoir for the percentiles and reference range counts per judge.
+# summaries() has the layout of summarize.summarize_metric, so the judges start from it without the frames.
+# While the user is still talking, a smoothed value far outside every judge's range turns into a short hint.
+
+RESERVOIR = 256 # samples kept per metric for p10 / p90, exact up to this many frames
+SMOOTHING = 0.5 # weight of the newest frame in the value hints look at
+HINT_MIN_FRAMES = 2 # valid frames before a metric may hint, one bad detection is not a habit
+HINT_COOLDOWN = 4.0 # seconds before the same hint fires again
+HINT_SHOW = 3.0 # seconds a hint stays on the feed
+MIN_SPAN = {"deg": 5.0} # narrowest reference range a hint is measured against, 0.1 for the other units
+
+# metric -> (hint above the references, hint below them), None where there is nothing worth saying
+HINTS = {
+    "torso_lean": ("Torso leaning, stand up straight", None),
+    "shoulder_tilt": ("Level your shoulders", None),
+    "head_tilt": ("Keep your head level", None),
+    "hand_height": ("Hands are high, bring them to chest level", "Bring your hands up into view"),
+    "hand_span": ("Gestures are very wide, bring them in", "Open up your hands"),
+    "wrist_velocity": ("Slow down your gestures", "Use your hands more"),
+}
+
+class _Running(object):
+    __slots__ = ("frames", "valid", "mean", "min", "max", "bucket_sum", "bucket_n", "reservoir", "counts", "smooth")
+
+    def __init__(self, points, judges):
+        self.frames = 0
+        self.valid = 0
+        self.mean = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.bucket_sum = np.zeros(points)
+        self.bucket_n = np.zeros(points, np.int64)
+        self.reservoir = np.empty(RESERVOIR)
+        self.counts = {j: np.zeros(4, np.int64) for j in judges} # inside, below, above, far
+        self.smooth = None
+
+    def add(self, value, bucket, ranges, rng):
+        self.frames += 1
+        if value != value: # NaN, landmarks not visible
+            return
+        self.valid += 1
+        self.mean += (value - self.mean) / self.valid
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.bucket_sum[bucket] += value
+        self.bucket_n[bucket] += 1
+        if self.valid <= RESERVOIR:
+            self.reservoir[self.valid - 1] = value
+        else:
+            j = rng.integers(self.valid)
+            if j < RESERVOIR:
+                self.reservoir[j] = value
+        for judge, (lo, hi) in ranges.items():
+            span = max(hi - lo, 1e-9)
+            dist = max(lo - value, 0) + max(value - hi, 0)
+            self.counts[judge] += (dist == 0, value < lo, value > hi, dist > span)
+        self.smooth = value if self.smooth is None else SMOOTHING * value + (1 - SMOOTHING) * self.smooth
+
+class LiveAnalyzer(object):
+    # references: judge id -> reference_index.load_reference_stats(judge id); duration, interval in seconds
+    def __init__(self, references, duration, interval, points=TREND_POINTS, seed=0):
+        self.duration = duration
+        self.interval = interval
+        self.points = points
+        self.references = references
+        # judge -> metric -> (ref_min, ref_max), only where the references have a range
+        self._ranges = {m: {j: (s[m]["ref_min"], s[m]["ref_max"]) for j, s in references.items()
+                            if s.get(m, {}).get("ref_min") is not None and s[m].get("ref_max") is not None}
+                        for m in METRICS}
+        self._bounds = {}
+        for m, ranges in self._ranges.items():
+            if ranges:
+                lo, hi = min(r[0] for r in ranges.values()), max(r[1] for r in ranges.values())
+                self._bounds[m] = (lo, hi, max(hi - lo, MIN_SPAN.get(METRICS[m][1], 0.1)))
+        self._stats = {m: _Running(points, self._ranges[m]) for m in METRICS}
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+        self._prev = None # (timestamp_ms, (33, 4)) of the latest frame, for the velocity metric
+        self._fired = {} # (metric, direction) -> time
+        self._shown = [] # (time, hint)
+
+    def _bucket(self, idx, timestamp_ms):
+        t = timestamp_ms / 1000 if timestamp_ms is not None else idx * self.interval
+        return min(max(int(t / max(self.duration, 1e-9) * self.points), 0), self.points - 1)
+
+    def add(self, idx, timestamp_ms, landmarks):
+        # one extractor result, landmarks (33, 4) or None; -> list of new hints
+        data = np.full((33, 4), np.nan, np.float32) if landmarks is None else np.asarray(landmarks, np.float32)
+        with self._lock:
+            prev = self._prev
+            t = timestamp_ms if timestamp_ms is not None else idx * self.interval * 1000
+            if prev is not None and prev[0] < t: # results of two extractor workers can arrive out of order
+                frames, timestamps = np.stack([prev[1], data]), [prev[0], t]
+            else:
+                frames, timestamps = data[None], [t]
+            if prev is None or prev[0] < t:
+                self._prev = (t, data)
+            bucket = self._bucket(idx, timestamp_ms)
+            with np.errstate(invalid="ignore", divide="ignore"), warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)
+                for name, stats in self._stats.items():
+                    value = float(compute_metric(name, frames, timestamps)[-1])
+                    stats.add(value, bucket, self._ranges[name], self._rng)
+            return self._hints(time.time())
+
+    def _hints(self, now):
+        new = []
+        for name, texts in HINTS.items():
+            stats, bounds = self._stats[name], self._bounds.get(name)
+            if bounds is None or stats.smooth is None or stats.valid < HINT_MIN_FRAMES:
+                continue
+            lo, hi, span = bounds
+            direction = 0 if stats.smooth > hi + span else 1 if stats.smooth < lo - span else None
+            if direction is None or texts[direction] is None:
+                continue
+            if now - self._fired.get((name, direction), -np.inf) < HINT_COOLDOWN:
+                continue
+            self._fired[(name, direction)] = now
+            hint = {"metric": name, "hint": texts[direction], "value": round(float(stats.smooth), 2)}
+            self._shown.append((now, hint))
+            new.append(hint)
+        return new
+
+    def active_hints(self, now=None):
+        # hint texts to draw on the feed right now
+        now = time.time() if now is None else now
+        with self._lock:
+            self._shown = [(t, h) for t, h in self._shown if now - t < HINT_SHOW]
+            return [h["hint"] for _, h in self._shown]
+
+    def summary(self, name, judge_id):
+        # what summarize.summarize_metric returns for the whole capture, from the running state
+        unit = METRICS[name][1]
+        digits = digits_for(unit)
+
+        def q(v):
+            return round(float(v), digits) if digits else int(round(float(v)))
+
+        stats = self._stats[name]
+        ref = self.references.get(judge_id, {}).get(name, {})
+        out = {"metric_name": name, "unit": unit, "frames": stats.frames, "valid": stats.valid}
+        if stats.valid:
+            filled = stats.bucket_n > 0
+            sample = stats.reservoir[:min(stats.valid, RESERVOIR)]
+            p10, p90 = np.percentile(sample, [10, 90])
+            out["trend"] = [q(v) for v in stats.bucket_sum[filled] / stats.bucket_n[filled]]
+            out.update(mean=q(stats.mean), p10=q(p10), p90=q(p90), min=q(stats.min), max=q(stats.max))
+            counts = stats.counts.get(judge_id)
+            if counts is not None:
+                inside, below, above, far = (round(float(c) / stats.valid, 2) for c in counts)
+                out.update(inside=inside, below=below, above=above, far=far)
+        out.update(ref_min=ref.get("ref_min"), ref_max=ref.get("ref_max"), ref_mean=ref.get("ref_mean"))
+        return out
+
+    def summaries(self):
+        # judge id -> metric -> summary
+        with self._lock:
+            return {j: {name: self.summary(name, j) for name in METRICS} for j in self.references}
@@ -0,0 +1,57 @@
+import re
+from difflib import SequenceMatcher
+
+from verdict import AggregatedReport, Suggestion, parse_verdict
+
+# local replacement for the Score_Aggregator call when the judges' verdicts are clean: one suggestion per
+# (judge, metric), in the aggregator's format; the model is only asked when judges disagree or the text needs rewriting
+
+SIMILAR = 0.85 # metric names this alike are the same metric
+MAX_SUGGESTION_CHARS = 400 # longer advice goes through the aggregator to be shortened
+
+def metric_key(name):
+    return re.sub(r"[^a-z0-9]+", " ", (name or "").lower()).strip()
+
+def same_metric(a, b, threshold=SIMILAR):
+    a, b = metric_key(a), metric_key(b)
+    return a == b or SequenceMatcher(None, a, b).ratio() >= threshold
+
+def to_suggestion(label, verdict):
+    # verdict: MetricVerdict or its dict
+    data = verdict if isinstance(verdict, dict) else verdict.model_dump()
+    return Suggestion(
+        suggestion=data.get("metric_analyzed", "").strip(),
+        severity=data["severity"], # already one of MetricVerdict's levels
+        description=f"{label}: {data['suggestion']}",
+        judge=label,
+    )
+
+def merge_verdicts(judge_results, labels):
+    # judge_results: judge name -> verdict text, empty for a judge that did not finish; labels: judge name -> display name
+    # -> (AggregatedReport, None), or (None, reason) when the aggregator model has to do it
+    merged = [] # (judge name, MetricVerdict)
+    for name, text in judge_results.items():
+        if not text:
+            continue
+        verdict = parse_verdict(text)
+        if verdict is None:
+            return None, f"{name}: no verdict to merge"
+        for v in verdict.verdicts:
+            if not v.suggestion.strip() or len(v.suggestion) > MAX_SUGGESTION_CHARS:
+                return None, f"{name}: {v.metric_analyzed} needs rephrasing"
+            for i, (other_name, other) in enumerate(merged):
+                if not same_metric(v.metric_analyzed, other.metric_analyzed):
+                    continue
+                if (v.severity > 0) != (other.severity > 0):
+                    return None, f"{name} and {other_name} disagree on {v.metric_analyzed}"
+                if other_name == name: # the judge repeated itself, keep the harsher one
+                    if v.severity > other.severity:
+                        merged[i] = (name, v)
+                    break
+            else:
+                merged.append((name, v))
+    if not merged:
+        return None, "nothing to merge"
+    suggestions = [to_suggestion(labels.get(name, name), v) for name, v in merged]
+    suggestions.sort(key=lambda s: s.severity, reverse=True)
+    return AggregatedReport(suggestions=suggestions), None
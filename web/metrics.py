@@ -0,0 +1,111 @@
+import warnings
+import numpy as np
+
+# vectorized body-language metrics over (frames, 33, 4) [x, y, z, visibility] arrays
+# every metric returns one float per frame, NaN where the needed landmarks are not visible
+
+NOSE = 0
+L_EAR, R_EAR = 7, 8
+L_SHOULDER, R_SHOULDER = 11, 12
+L_ELBOW, R_ELBOW = 13, 14
+L_WRIST, R_WRIST = 15, 16
+L_INDEX, R_INDEX = 19, 20
+L_HIP, R_HIP = 23, 24
+
+VIS_MIN = 0.5
+DEFAULT_FPS = 1.0 # capture sampling rate when no timestamps are known
+
+def _xy(data, i):
+    return np.asarray(data[:, i, :2], dtype=np.float64)
+
+def _mask(data, values, *idx):
+    visible = (np.asarray(data[:, list(idx), 3]) >= VIS_MIN).all(axis=1)
+    return np.where(visible.reshape(visible.shape + (1,) * (np.ndim(values) - 1)), values, np.nan)
+
+def _angle(u, v):
+    cos = (u * v).sum(-1) / (np.linalg.norm(u, axis=-1) * np.linalg.norm(v, axis=-1) + 1e-9)
+    return np.degrees(np.arccos(np.clip(cos, -1.0, 1.0)))
+
+def _mid(data, a, b):
+    return (_xy(data, a) + _xy(data, b)) / 2
+
+def shoulder_width(data):
+    return _mask(data, np.linalg.norm(_xy(data, L_SHOULDER) - _xy(data, R_SHOULDER), axis=-1), L_SHOULDER, R_SHOULDER)
+
+def joint_angle(data, a, b, c):
+    # angle at b in degrees, 180 = straight
+    return _mask(data, _angle(_xy(data, a) - _xy(data, b), _xy(data, c) - _xy(data, b)), a, b, c)
+
+def distance(data, a, b):
+    # in shoulder widths so it does not depend on how far the speaker stands from the camera
+    d = np.linalg.norm(_xy(data, a) - _xy(data, b), axis=-1)
+    return _mask(data, d, a, b) / shoulder_width(data)
+
+def torso_lean(data):
+    # degrees between hip-mid -> shoulder-mid and straight up (image y grows downwards)
+    up = _mid(data, L_SHOULDER, R_SHOULDER) - _mid(data, L_HIP, R_HIP)
+    return _mask(data, _angle(up, np.array([0.0, -1.0])), L_SHOULDER, R_SHOULDER, L_HIP, R_HIP)
+
+def line_tilt(data, a, b):
+    # degrees of the a-b line away from horizontal
+    d = _xy(data, b) - _xy(data, a)
+    return _mask(data, np.degrees(np.arctan2(np.abs(d[:, 1]), np.abs(d[:, 0]))), a, b)
+
+def hand_height(data):
+    # shoulder-mid height minus wrist-mid height, positive = hands above shoulders
+    h = _mid(data, L_SHOULDER, R_SHOULDER)[:, 1] - _mid(data, L_WRIST, R_WRIST)[:, 1]
+    return _mask(data, h, L_WRIST, R_WRIST) / shoulder_width(data)
+
+def steeple_angle(data):
+    # angle between the two forearms, small = fingertips pressed together in a narrow steeple
+    u = _xy(data, L_WRIST) - _xy(data, L_ELBOW)
+    v = _xy(data, R_WRIST) - _xy(data, R_ELBOW)
+    return _mask(data, 180.0 - _angle(u, -v), L_ELBOW, L_WRIST, R_ELBOW, R_WRIST)
+
+def symmetry(left, right):
+    return np.abs(left - right)
+
+def velocity(data, i, timestamps=None):
+    # landmark speed in shoulder widths per second, first frame is NaN
+    n = len(data)
+    if n < 2:
+        return np.full(n, np.nan)
+    t = np.asarray(timestamps, dtype=np.float64) / 1000 if timestamps is not None else None
+    if t is None or np.isnan(t).any():
+        t = np.arange(n) / DEFAULT_FPS
+    step = np.linalg.norm(np.diff(_mask(data, _xy(data, i), i), axis=0), axis=-1)
+    dt = np.maximum(np.diff(t), 1e-3)
+    return np.concatenate([[np.nan], step / dt / np.nanmean(shoulder_width(data))])
+
+def wrist_velocity(data, timestamps=None):
+    return np.nanmean(np.stack([velocity(data, L_WRIST, timestamps), velocity(data, R_WRIST, timestamps)]), axis=0)
+
+def _elbow_l(d, t=None): return joint_angle(d, L_SHOULDER, L_ELBOW, L_WRIST)
+def _elbow_r(d, t=None): return joint_angle(d, R_SHOULDER, R_ELBOW, R_WRIST)
+
+# name -> (function(data, timestamps), unit, description)
+METRICS = {
+    "left_elbow_angle": (_elbow_l, "deg", "Left shoulder-elbow-wrist angle (11-13-15), 180 = straight arm"),
+    "right_elbow_angle": (_elbow_r, "deg", "Right shoulder-elbow-wrist angle (12-14-16), 180 = straight arm"),
+    "elbow_angle": (lambda d, t=None: np.nanmean(np.stack([_elbow_l(d), _elbow_r(d)]), axis=0), "deg", "Mean of both elbow angles"),
+    "left_arm_raise": (lambda d, t=None: joint_angle(d, L_HIP, L_SHOULDER, L_ELBOW), "deg", "Left hip-shoulder-elbow angle (23-11-13), 0 = arm down"),
+    "right_arm_raise": (lambda d, t=None: joint_angle(d, R_HIP, R_SHOULDER, R_ELBOW), "deg", "Right hip-shoulder-elbow angle (24-12-14), 0 = arm down"),
+    "hand_span": (lambda d, t=None: distance(d, L_WRIST, R_WRIST), "x shoulder width", "Distance between wrists (15-16)"),
+    "fingertip_gap": (lambda d, t=None: distance(d, L_INDEX, R_INDEX), "x shoulder width", "Distance between index fingertips (19-20)"),
+    "steeple_angle": (lambda d, t=None: steeple_angle(d), "deg", "Angle between the forearms (13-15 vs 14-16)"),
+    "hand_height": (lambda d, t=None: hand_height(d), "x shoulder width", "Shoulder height minus wrist height, positive = hands above shoulders"),
+    "torso_lean": (lambda d, t=None: torso_lean(d), "deg", "Hip-mid to shoulder-mid line away from vertical, 0 = upright"),
+    "shoulder_tilt": (lambda d, t=None: line_tilt(d, L_SHOULDER, R_SHOULDER), "deg", "Shoulder line (11-12) away from horizontal"),
+    "head_tilt": (lambda d, t=None: line_tilt(d, L_EAR, R_EAR), "deg", "Ear line (7-8) away from horizontal"),
+    "arm_symmetry": (lambda d, t=None: symmetry(_elbow_l(d), _elbow_r(d)), "deg", "Absolute difference between left and right elbow angles"),
+    "wrist_velocity": (wrist_velocity, "x shoulder width / s", "Mean speed of both wrists"),
+}
+
+def compute_metric(name, data, timestamps=None):
+    func = METRICS[name][0]
+    with np.errstate(invalid="ignore", divide="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning) # all-NaN frames
+        return func(np.asarray(data), timestamps)
+
+def describe_metrics():
+    return "\n".join(f"- `{name}` ({unit}): {desc}" for name, (_, unit, desc) in METRICS.items())
@@ -1,39 +1,149 @@
-from autogen_agentchat.messages import TextMessage
-from run_judge import run_analysis_session
+from autogen_agentchat.messages import TextMessage, StructuredMessage
+from agent_loader import get_model_client
+from run_judge import run_analysis_session, parse_judge_output, PROMPT_VERSION
+from summarize import clip_text, dumps
+from verdict import AggregatedReport, parse_report, structured_retry
+from merge import merge_verdicts
+from reference_index import content_hash, reference_files
+from verdict_cache import cache_key
+from scheduler import scheduler
+from _trace import tracer
 import asyncio
 
-async def run_pipeline(
+AGGREGATOR_MAX_CHARS = 6000 # whole aggregator input, split evenly between the judges
+REPORT_RETRY_PROMPT = (
+    "Merge the judges' verdicts below into {\"suggestions\": [...]}, one entry per distinct idea: "
+    "suggestion (short title), severity (the judge's severity), description (one sentence naming the judge), judge (judge name)."
+)
+
+def compact_judge_results(judge_results, max_chars=AGGREGATOR_MAX_CHARS):
+    # the parsed verdicts of every judge, or the end of its answer when nothing parses
+    per_judge = max_chars // max(len(judge_results), 1)
+    compact = {}
+    for name, text in judge_results.items():
+        verdicts = parse_judge_output(text)
+        compact[name] = verdicts if verdicts else clip_text(text or "", per_judge)
+    return clip_text(dumps(compact), max_chars)
+
+async def iter_pipeline(
     feature_extractor,
     judges,
     aggregator,
+    landmark_digest=None,
+    cache=None,
+    spawn=None,
+    judge_scheduler=scheduler,
 ):
+    # yields ("judge", judge_agent, text) as soon as each judge finishes, then ("final", None, aggregated json)
+    # a judge out of attempts or past its deadline yields "" and the aggregator goes on with the others
+    # spawn(judge_agent) -> fresh (feature_extractor, judge) for every attempt, so judges running side by side share no
+    # model context; without it all judges share feature_extractor and a retry resets the judge
+    use_cache = cache is not None and landmark_digest is not None
+
     async def process_single_judge(judge_agent):
+        key = cache_key(
+            "judge", landmark_digest, judge_agent.name, PROMPT_VERSION,
+            judge_agent.model_name, feature_extractor.model_name,
+            content_hash(reference_files(judge_agent.name)),
+            dumps(getattr(judge_agent, "live_metrics", None)), # the task carries them
+        )
+        if use_cache:
+            cached = cache.get(key)
+            if cached is not None:
+                print(f"{judge_agent.name} Cached.")
+                return judge_agent, cached
+
         print(f"Judge Analysis: {judge_agent.name}...")
 
-        result = await run_analysis_session(
-            feature_extractor_agent=feature_extractor,
-            judge_agent=judge_agent,
-        )
+        async def attempt(n, cancellation_token):
+            if spawn is not None:
+                fe, judge = spawn(judge_agent)
+            else:
+                fe, judge = feature_extractor, judge_agent
+                if n > 0:
+                    await judge_agent.on_reset(cancellation_token)
+            return await run_analysis_session(
+                feature_extractor_agent=fe,
+                judge_agent=judge,
+                cancellation_token=cancellation_token,
+            )
 
-        print(f"{judge_agent.name} Done.")
-        return judge_agent.name, result
+        with tracer.span("judge", agent=judge_agent.name) as info:
+            result, info["status"] = await judge_scheduler.run(judge_agent.name, attempt, hedge=spawn is not None)
+
+        if use_cache and result:
+            cache.put(key, result)
+        print(f"{judge_agent.name} Done ({info['status']}).")
+        return judge_agent, result or ""
 
     tasks = [process_single_judge(judge) for judge in judges]
 
-    results_list = await asyncio.gather(*tasks)
+    judge_results = {}
+    for next_done in asyncio.as_completed(tasks):
+        judge_agent, result = await next_done
+        judge_results[judge_agent.name] = result
+        yield "judge", judge_agent, result
 
-    judge_results = dict(results_list)
+    judge_results = {judge.name: judge_results[judge.name] for judge in judges} # stable order for the cache key
 
     print("=====Results=====")
     print(judge_results)
 
-    final = await aggregator.on_messages(
-        [TextMessage(content=str(judge_results), source="system")],
-        cancellation_token=None
-    )
+    missing = [name for name, text in judge_results.items() if not text]
+    if len(missing) == len(judge_results):
+        raise RuntimeError("no judge returned a verdict")
+    if missing:
+        print(f"aggregating without {missing}")
+
+    # clean verdicts are merged here, the aggregator model only settles conflicts and rewrites
+    with tracer.span("merge") as info:
+        report, reason = merge_verdicts(judge_results, {judge.name: getattr(judge, "label", judge.name) for judge in judges})
+        info["fallback"] = reason
+    if report is not None:
+        final_content = dumps([s.model_dump() for s in report.suggestions])
+        print(final_content)
+        yield "final", None, final_content
+        return
+    print(f"aggregator needed: {reason}")
+
+    aggregator_input = compact_judge_results({name: text for name, text in judge_results.items() if text})
 
-    final_content = final.chat_message.content
+    key = cache_key("aggregator", aggregator_input, PROMPT_VERSION, aggregator.model_name)
+    if use_cache:
+        cached = cache.get(key)
+        if cached is not None:
+            yield "final", None, cached
+            return
+
+    report = None
+    try:
+        with tracer.span("aggregator", agent=aggregator.name, input_chars=len(aggregator_input)):
+            final = await aggregator.on_messages(
+                [TextMessage(content=aggregator_input, source="system")],
+                cancellation_token=None
+            )
+        msg = final.chat_message
+        if msg.models_usage is not None:
+            tracer.add_tokens(aggregator.name, msg.models_usage.prompt_tokens, msg.models_usage.completion_tokens)
+        report = msg.content if isinstance(msg, StructuredMessage) else parse_report(msg.content)
+    except Exception as e: # the structured response did not validate
+        print(f"aggregator Error: {e}")
+    if report is None:
+        report = await structured_retry(get_model_client(aggregator.model_name), AggregatedReport, REPORT_RETRY_PROMPT, aggregator_input)
+    if report is None:
+        raise RuntimeError("aggregator returned no valid report")
+
+    final_content = dumps([s.model_dump() for s in report.suggestions])
 
     print(final_content)
 
+    if use_cache:
+        cache.put(key, final_content)
+    yield "final", None, final_content
+
+async def run_pipeline(*args, **kwargs):
+    final_content = None
+    async for kind, _, content in iter_pipeline(*args, **kwargs):
+        if kind == "final":
+            final_content = content
     return final_content
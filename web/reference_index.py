@@ -0,0 +1,113 @@
+import glob
+import hashlib
+import json
+import os
+import sys
+import threading
+import warnings
+import numpy as np
+
+from _pose import PoseSequence
+from metrics import METRICS, compute_metric
+
+INDEX_VERSION = 1
+INDEX_FILE = "reference_index.json" # next to reference/, not inside it
+PERCENTILES = (10, 25, 50, 75, 90)
+CURVE_POINTS = 20 # time-normalized curve length
+
+_lock = threading.Lock()
+_memo = {} # (work_dir, judge_id) -> entry
+
+def reference_files(judge_id, work_dir=".coding"):
+    return sorted(glob.glob(os.path.join(work_dir, "reference", f"{judge_id}_*.json")))
+
+def content_hash(paths):
+    h = hashlib.sha256(f"v{INDEX_VERSION}:{','.join(METRICS)}".encode())
+    for path in paths:
+        h.update(os.path.basename(path).encode())
+        with open(path, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+def _curve(values):
+    # resample a per-frame series to CURVE_POINTS over normalized time
+    values = np.asarray(values, dtype=np.float64)
+    ok = ~np.isnan(values)
+    if not ok.any():
+        return None
+    t = np.linspace(0, 1, len(values))[ok]
+    return np.interp(np.linspace(0, 1, CURVE_POINTS), t, values[ok]) if len(t) > 1 else np.full(CURVE_POINTS, values[ok][0])
+
+def _r(v):
+    return None if v is None or np.isnan(v) else round(float(v), 4)
+
+def build_entry(judge_id, work_dir=".coding"):
+    paths = reference_files(judge_id, work_dir)
+    refs = [PoseSequence.from_json(p) for p in paths]
+    entry = {"hash": content_hash(paths), "files": [os.path.basename(p) for p in paths], "metrics": {}}
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        for name in METRICS:
+            series = [compute_metric(name, ref.data, ref.timestamps) for ref in refs]
+            avg = np.array([np.nanmean(s) if len(s) else np.nan for s in series])
+            avg = avg[~np.isnan(avg)]
+            curves = [c for c in map(_curve, series) if c is not None]
+            stats = {"n": int(len(avg)), "ref_min": None, "ref_max": None, "ref_mean": None, "ref_std": None, "curve": None}
+            stats.update({f"p{p}": None for p in PERCENTILES})
+            if len(avg):
+                stats.update({
+                    "ref_min": _r(avg.min()),
+                    "ref_max": _r(avg.max()),
+                    "ref_mean": _r(avg.mean()),
+                    "ref_std": _r(avg.std()),
+                })
+                stats.update({f"p{p}": _r(v) for p, v in zip(PERCENTILES, np.percentile(avg, PERCENTILES))})
+            if curves:
+                stats["curve"] = [_r(v) for v in np.mean(curves, axis=0)]
+            entry["metrics"][name] = stats
+    return entry
+
+def _read_index(path):
+    if not os.path.exists(path):
+        return {"version": INDEX_VERSION, "judges": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        index = json.load(f)
+    if index.get("version") != INDEX_VERSION:
+        return {"version": INDEX_VERSION, "judges": {}}
+    return index
+
+def _write_index(path, index):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(tmp, path)
+
+def load_reference_stats(judge_id, work_dir=".coding"):
+    # {metric: {ref_min, ref_max, ref_mean, ref_std, p10..p90, curve, n}}, rebuilt only when a reference file changed
+    digest = content_hash(reference_files(judge_id, work_dir))
+    key = (os.path.abspath(work_dir), judge_id)
+    with _lock:
+        entry = _memo.get(key)
+        if entry and entry["hash"] == digest:
+            return entry["metrics"]
+        path = os.path.join(work_dir, INDEX_FILE)
+        index = _read_index(path)
+        entry = index["judges"].get(judge_id)
+        if not entry or entry["hash"] != digest:
+            print(f"reference index: rebuilding {judge_id}")
+            entry = build_entry(judge_id, work_dir)
+            index["judges"][judge_id] = entry
+            _write_index(path, index)
+        _memo[key] = entry
+        return entry["metrics"]
+
+def judge_ids(work_dir=".coding"):
+    names = {os.path.basename(p).rsplit("_", 1)[0] for p in glob.glob(os.path.join(work_dir, "reference", "*_*.json"))}
+    return sorted(n for n in names if n.startswith("Judge_"))
+
+if __name__ == "__main__":
+    # offline: python reference_index.py [work_dir]
+    work_dir = sys.argv[1] if len(sys.argv) > 1 else ".coding"
+    for judge_id in judge_ids(work_dir):
+        stats = load_reference_stats(judge_id, work_dir)
+        print(judge_id, f"{len(stats)} metrics")
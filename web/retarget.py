@@ -0,0 +1,227 @@
+import warnings
+import numpy as np
+
+from metrics import (
+    compute_metric,
+    L_EAR, R_EAR, L_SHOULDER, R_SHOULDER, L_ELBOW, R_ELBOW, L_WRIST, R_WRIST, L_INDEX, R_INDEX, L_HIP, R_HIP,
+)
+
+# kinematic "ideal skeleton": moves the user's own landmarks until a metric hits its target,
+# bone lengths stay fixed, children follow their parent joint; works on (frames, 33, 4) arrays in normalized image coords.
+# Normalized x and y have different units unless the frame is square, so the solver runs with x scaled by w / h
+# (rotations and distances then mean the same as in the picture) and the metrics are read back in normalized coords
+
+HEAD = list(range(0, 11))
+UPPER_BODY = list(range(0, 23)) # everything above the hips
+L_HAND = [L_WRIST, 17, L_INDEX, 21]
+R_HAND = [R_WRIST, 18, R_INDEX, 22]
+L_ARM = [L_ELBOW] + L_HAND
+R_ARM = [R_ELBOW] + R_HAND
+
+SECANT_STEPS = 8
+TOL = 1e-3
+
+def _signed(u, v):
+    # signed angle in degrees from u to v, per frame
+    return np.degrees(np.arctan2(u[..., 0] * v[..., 1] - u[..., 1] * v[..., 0], (u * v).sum(-1)))
+
+def _rotate(out, idx, pivot, deg):
+    # rotate landmarks idx of every frame about pivot (frames, 2) by deg (frames,)
+    rad = np.radians(deg)[:, None]
+    c, s = np.cos(rad), np.sin(rad)
+    p = out[:, idx, :2] - pivot[:, None]
+    out[:, idx, 0] = pivot[:, None, 0] + c * p[..., 0] - s * p[..., 1]
+    out[:, idx, 1] = pivot[:, None, 1] + s * p[..., 0] + c * p[..., 1]
+    return out
+
+def _open(out, pivot, ref, moving, deg):
+    # widen the angle ref-pivot-moving[0] by deg, whichever way that joint is bent
+    p = out[:, pivot, :2]
+    sign = np.sign(_signed(out[:, ref, :2] - p, out[:, moving[0], :2] - p))
+    return _rotate(out, moving, p.copy(), np.where(sign == 0, 1.0, sign) * deg)
+
+def _mid(out, a, b):
+    return (out[:, a, :2] + out[:, b, :2]) / 2
+
+def _reach(out, shoulder, elbow, hand, goal):
+    # two-bone IK: put the wrist (hand[0]) at goal (frames, 2), keep both bone lengths and the side the elbow bends to
+    s, e, w = out[:, shoulder, :2], out[:, elbow, :2], out[:, hand[0], :2]
+    l1 = np.linalg.norm(e - s, axis=-1)
+    l2 = np.linalg.norm(w - e, axis=-1)
+    d = goal - s
+    dist = np.clip(np.linalg.norm(d, axis=-1), np.abs(l1 - l2) + 1e-6, l1 + l2 - 1e-6)
+    unit = d / (np.linalg.norm(d, axis=-1, keepdims=True) + 1e-9)
+    bend = np.sign(_signed(w - s, e - s))
+    a = np.degrees(np.arccos(np.clip((l1 ** 2 + dist ** 2 - l2 ** 2) / (2 * l1 * dist + 1e-9), -1.0, 1.0)))
+    a *= np.where(bend == 0, 1.0, bend)
+    rad = np.radians(a)[:, None]
+    c, sn = np.cos(rad), np.sin(rad)
+    new_e = s + l1[:, None] * np.concatenate([c * unit[:, :1] - sn * unit[:, 1:], sn * unit[:, :1] + c * unit[:, 1:]], axis=-1)
+    new_w = s + unit * dist[:, None]
+
+    turn_upper = _signed(e - s, new_e - s)
+    turn_fore = _signed(w - e, new_w - new_e)
+    _rotate(out, [elbow] + hand, s.copy(), turn_upper) # elbow lands on new_e
+    _rotate(out, hand, new_e, turn_fore - turn_upper)
+    return out
+
+def _metric(name, data, aspect):
+    # compute_metric on solver coords, whose x is scaled by aspect
+    if aspect == 1.0:
+        return compute_metric(name, data)
+    data = data.copy()
+    data[..., 0] /= aspect
+    return compute_metric(name, data)
+
+def _solve(data, name, goal, apply, aspect=1.0):
+    # secant search per frame for the rotation that brings metric `name` to goal, frames without a value are left alone
+    f0 = _metric(name, data, aspect) - goal
+    ok = ~np.isnan(f0)
+    if not ok.any():
+        return data
+    x0, x1 = np.zeros(len(data)), np.where(ok, -f0, 0.0)
+    x1 = np.where(np.abs(x1) < 1e-3, 1.0, x1)
+    f1 = _metric(name, apply(data.copy(), x1), aspect) - goal
+    for _ in range(SECANT_STEPS):
+        done = ~ok | (np.abs(f1) < TOL) | np.isnan(f1)
+        if done.all():
+            break
+        slope = (f1 - f0) / np.where(x1 - x0 == 0, 1e-9, x1 - x0)
+        x2 = np.where(done | (np.abs(slope) < 1e-9), x1, x1 - f1 / np.where(slope == 0, 1e-9, slope))
+        x0, f0, x1 = x1, f1, np.clip(x2, -180.0, 180.0)
+        f1 = _metric(name, apply(data.copy(), x1), aspect) - goal
+    # keep the original frame wherever the search did not improve it
+    base = np.abs(_metric(name, data, aspect) - goal)
+    better = ok & (np.abs(f1) <= base)
+    return np.where(better[:, None, None], apply(data.copy(), np.where(better, x1, 0.0)), data)
+
+def _elbow(side):
+    shoulder, elbow, hand = (L_SHOULDER, L_ELBOW, L_HAND) if side == "left" else (R_SHOULDER, R_ELBOW, R_HAND)
+    return lambda d, deg: _open(d, elbow, shoulder, hand, deg)
+
+def _raise(side):
+    hip, shoulder, arm = (L_HIP, L_SHOULDER, L_ARM) if side == "left" else (R_HIP, R_SHOULDER, R_ARM)
+    return lambda d, deg: _open(d, shoulder, hip, arm, deg)
+
+def _both(a, b):
+    return lambda d, deg: b(a(d, deg), deg)
+
+def _upper_body(d, deg):
+    return _rotate(d, UPPER_BODY, _mid(d, L_HIP, R_HIP), deg)
+
+def _shoulder_line(d, deg):
+    return _rotate(d, UPPER_BODY, _mid(d, L_SHOULDER, R_SHOULDER), deg)
+
+def _head(d, deg):
+    return _rotate(d, HEAD, _mid(d, L_EAR, R_EAR), deg)
+
+def _span(a, b, hands_a, hands_b):
+    # move the two effectors a, b apart along their own line to goal * shoulder width, then solve both arms for it;
+    # the fingertips are not on the wrist so that takes a few passes
+    def solve(d, goal, aspect=1.0, passes=3):
+        for _ in range(passes):
+            d = _span_step(d, goal, aspect)
+        return d
+
+    def _span_step(d, goal, aspect):
+        # the goal is in normalized shoulder widths, the move happens in solver coords
+        scale = np.array([1 / aspect, 1.0])
+        sw = np.linalg.norm((d[:, L_SHOULDER, :2] - d[:, R_SHOULDER, :2]) * scale, axis=-1)
+        pa, pb = d[:, a, :2], d[:, b, :2]
+        m = (pa + pb) / 2
+        gap = np.linalg.norm(pa - pb, axis=-1)
+        u = (pa - pb) / (gap[:, None] + 1e-9)
+        half = (gap * goal * sw / (np.linalg.norm((pa - pb) * scale, axis=-1) + 1e-9) / 2)[:, None]
+        wa = d[:, hands_a[0], :2] + (m + u * half - pa)
+        wb = d[:, hands_b[0], :2] + (m - u * half - pb)
+        out = d.copy()
+        _reach(out, L_SHOULDER, L_ELBOW, hands_a, wa)
+        _reach(out, R_SHOULDER, R_ELBOW, hands_b, wb)
+        ok = ~np.isnan(goal) & ~np.isnan(sw)
+        return np.where(ok[:, None, None], out, d)
+    return solve
+
+# metric -> rotation solved by secant search, proximal joints first so the distal ones are fixed last
+ROTATIONS = {
+    "torso_lean": _upper_body,
+    "shoulder_tilt": _shoulder_line,
+    "head_tilt": _head,
+    "left_arm_raise": _raise("left"),
+    "right_arm_raise": _raise("right"),
+    "hand_height": _both(_raise("left"), _raise("right")),
+    "left_elbow_angle": _elbow("left"),
+    "right_elbow_angle": _elbow("right"),
+    "elbow_angle": _both(_elbow("left"), _elbow("right")),
+    "steeple_angle": _both(_elbow("left"), _elbow("right")), # opening both elbows swings the forearms apart
+}
+# metric -> direct IK, called with the per-frame goal
+DIRECT = {
+    "hand_span": _span(L_WRIST, R_WRIST, L_HAND, R_HAND),
+    "fingertip_gap": _span(L_INDEX, R_INDEX, L_HAND, R_HAND),
+}
+ORDER = [
+    "torso_lean", "shoulder_tilt", "head_tilt",
+    "left_arm_raise", "right_arm_raise", "hand_height",
+    "hand_span", "fingertip_gap",
+    "left_elbow_angle", "right_elbow_angle", "elbow_angle", "steeple_angle", "arm_symmetry",
+]
+SUPPORTED = set(ORDER)
+
+def _symmetry(d, goal, aspect=1.0):
+    # pull both elbows to their mean, then apart by goal/2 each, the larger one stays larger
+    left, right = _metric("left_elbow_angle", d, aspect), _metric("right_elbow_angle", d, aspect)
+    mean, sign = (left + right) / 2, np.where(left >= right, 1.0, -1.0)
+    d = _solve(d, "left_elbow_angle", mean + sign * goal / 2, _elbow("left"), aspect)
+    return _solve(d, "right_elbow_angle", mean - sign * goal / 2, _elbow("right"), aspect)
+
+def frame_goals(values, target):
+    # target is a number, or (lo, hi): frames already inside the range are not moved
+    if isinstance(target, (tuple, list)):
+        lo, hi = target
+        return np.clip(values, lo if lo is not None else -np.inf, hi if hi is not None else np.inf)
+    return np.full(len(values), float(target))
+
+def retarget(data, targets, aspect=1.0):
+    # data (frames, 33, 4), targets {metric: value or (lo, hi)}, aspect: frame width / height
+    # -> adjusted copy, visibility and z untouched
+    out = np.array(data, dtype=np.float32, copy=True)
+    if out.ndim == 2:
+        return retarget(out[None], targets, aspect)[0]
+    out[..., 0] *= aspect
+    with np.errstate(invalid="ignore", divide="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        for name in ORDER:
+            if name not in targets:
+                continue
+            values = _metric(name, out, aspect)
+            goal = np.where(np.isnan(values), np.nan, frame_goals(values, targets[name]))
+            if name in ROTATIONS:
+                out = _solve(out, name, goal, ROTATIONS[name], aspect)
+            elif name in DIRECT:
+                out = DIRECT[name](out, goal, aspect)
+            else:
+                out = _symmetry(out, goal, aspect)
+    out[..., 0] /= aspect
+    return out.astype(np.float32)
+
+def reference_targets(data, ref_stats, metrics=None, force=()):
+    # metrics whose user mean falls outside the reference range (or listed in force), aimed at the reference mean
+    targets = {}
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        for name in metrics or ORDER:
+            stats = ref_stats.get(name)
+            if name not in SUPPORTED or not stats or stats.get("ref_mean") is None:
+                continue
+            mean = np.nanmean(compute_metric(name, data))
+            if np.isnan(mean):
+                continue
+            if name in force or not stats["ref_min"] <= mean <= stats["ref_max"]:
+                targets[name] = stats["ref_mean"]
+    return targets
+
+def match_metrics(text):
+    # metrics whose every word shows up in a suggestion such as "Soften elbow angle to ~105°"
+    words = set(text.lower().replace("-", " ").replace("_", " ").split())
+    hits = [name for name in ORDER if set(name.split("_")) <= words]
+    return [h for h in hits if not any(h != o and set(h.split("_")) < set(o.split("_")) for o in hits)] # most specific only
@@ -1,44 +1,108 @@
+import json
+import os
+import time
+import numpy as np
+
 from autogen_agentchat.teams import RoundRobinGroupChat
-from autogen_agentchat.conditions import TextMentionTermination
-from autogen_agentchat.messages import TextMessage
-
-landmark_map = """0 - nose
-    1 - left eye (inner)
-    2 - left eye
-    3 - left eye (outer)
-    4 - right eye (inner)
-    5 - right eye
-    6 - right eye (outer)
-    7 - left ear
-    8 - right ear
-    9 - mouth (left)
-    10 - mouth (right)
-    11 - left shoulder
-    12 - right shoulder
-    13 - left elbow
-    14 - right elbow
-    15 - left wrist
-    16 - right wrist
-    17 - left pinky
-    18 - right pinky
-    19 - left index
-    20 - right index
-    21 - left thumb
-    22 - right thumb
-    23 - left hip
-    24 - right hip
-    25 - left knee
-    26 - right knee
-    27 - left ankle
-    28 - right ankle
-    29 - left heel
-    30 - right heel
-    31 - left foot index
-    32 - right foot index"""
-
-async def run_analysis_session(feature_extractor_agent, judge_agent):
-    term_key = "TERMINATE_SESSION"
-    termination = TextMentionTermination(term_key)
+from autogen_agentchat.base import TaskResult
+from autogen_agentchat.messages import TextMessage, ToolCallRequestEvent, ToolCallExecutionEvent
+from autogen_core.tools import FunctionTool
+
+from agent_loader import get_model_client
+from _trace import tracer
+
+from metrics import METRICS, describe_metrics
+from reference_index import load_reference_stats
+from summarize import summarize_metric, landmark_map, dumps
+from verdict import JudgeVerdict, VerdictTermination, parse_verdict, structured_retry
+
+PROMPT_VERSION = 5 # bump when the task below changes, cached verdicts are keyed on it
+
+VERDICT_RETRY_PROMPT = (
+    "Rewrite the judge's evaluation below as a JSON object {\"verdicts\": [...]} with one entry per metric: "
+    "metric_analyzed (str), severity (one of -2, -1, 1, 2, 3), suggestion (str). Keep the judge's wording and severities."
+)
+
+def parse_judge_output(text):
+    # list of {"metric_analyzed", "severity", "suggestion"} dicts, from a JudgeVerdict or from free text
+    verdict = parse_verdict(text)
+    return [v.model_dump() for v in verdict.verdicts] if verdict else []
+
+def load_session_data(work_dir=".coding"):
+    user = np.load(os.path.join(work_dir, "landmarks.npy"), mmap_mode="r")
+    timestamps = None
+    manifest_path = os.path.join(work_dir, "landmarks.manifest.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            timestamps = [np.nan if t is None else t for t in json.load(f)["timestamps"]]
+    return user, timestamps
+
+def make_metric_tool(judge_id, work_dir=".coding", live_metrics=None):
+    def compute_metrics(metric_names: list[str]) -> str:
+        unknown = [m for m in metric_names if m not in METRICS]
+        if unknown:
+            return f"Unknown metrics {unknown}. Available: {', '.join(METRICS)}"
+        if live_metrics:
+            return "\n".join(dumps(live_metrics[m]) for m in metric_names)
+        user, timestamps = load_session_data(work_dir)
+        ref_stats = load_reference_stats(judge_id) # shared index, work_dir only holds this session's landmarks
+        return "\n".join(dumps(summarize_metric(m, user, ref_stats[m], timestamps)) for m in metric_names)
+
+    return FunctionTool(
+        compute_metrics,
+        name="compute_metrics",
+        description="Compute built-in body-language metrics for the user and your reference samples. "
+                    "Prints one JSON line per metric: metric_name, unit, trend (segment means from begin to end), mean, p10, p90, min, max, "
+                    "the fraction of frames inside / below / above the reference range and far (more than one range span outside), ref_min, ref_max, ref_mean. "
+                    f"Available metrics: {', '.join(METRICS)}."
+    )
+
+async def run_traced(team, task, cancellation_token=None):
+    # team.run, with a span per agent turn and per tool execution, and token counts
+    result = None
+    last = time.time()
+    tool_start = {} # agent -> (time, tool names)
+    async for msg in team.run_stream(task=task, cancellation_token=cancellation_token):
+        now = time.time()
+        if isinstance(msg, TaskResult):
+            result = msg
+            break
+        usage = getattr(msg, "models_usage", None)
+        if usage is not None:
+            tracer.add_tokens(msg.source, usage.prompt_tokens, usage.completion_tokens)
+        if isinstance(msg, ToolCallRequestEvent):
+            tool_start[msg.source] = (now, [call.name for call in msg.content])
+        elif isinstance(msg, ToolCallExecutionEvent) and msg.source in tool_start:
+            start, names = tool_start.pop(msg.source)
+            tracer.record("tool", start, now, agent=msg.source, tools=names)
+        elif isinstance(msg, TextMessage) and msg.source != "user":
+            tracer.record("turn", last, now, agent=msg.source,
+                          tokens=usage.completion_tokens if usage is not None else None)
+            last = now
+    return result
+
+def fast_path(judge_agent):
+    # the built-in metrics, already summarized over the whole capture when the session ran a live analyzer
+    live_metrics = getattr(judge_agent, "live_metrics", None)
+    if not live_metrics:
+        return (
+            "0. **FAST PATH**: If every metric you selected is in the BUILT-IN METRIC LIBRARY below, call the `compute_metrics` tool yourself with their names, "
+            "skip the rest of this phase and go straight to PHASE 3 with its output. Prefer built-in metrics whenever they capture the habit.\n"
+            f"```\n{describe_metrics()}\n```\n"
+        )
+    return (
+        "0. **FAST PATH**: The BUILT-IN METRIC LIBRARY below is already computed for the user against your references, one JSON line per metric after the list. "
+        "These numbers cover every frame of the capture, `landmarks.json` only holds keyframes of it: treat the numbers as your primary evidence. "
+        "If every metric you selected is in it, read the numbers from there without calling any tool, skip the rest of this phase and go straight to PHASE 3. "
+        "Prefer built-in metrics whenever they capture the habit.\n"
+        f"```\n{describe_metrics()}\n```\n"
+        "```\n" + "\n".join(dumps(summary) for summary in live_metrics.values()) + "\n```\n"
+    )
+
+async def run_analysis_session(feature_extractor_agent, judge_agent, cancellation_token=None):
+    load_reference_stats(judge_agent.name) # rebuilds the index here, not inside a tool call, if a reference changed
+
+    termination = VerdictTermination([judge_agent.name]) # ends the team on the judge's first valid verdict
 
     team = RoundRobinGroupChat(
         participants=[judge_agent, feature_extractor_agent],
@@ -46,18 +110,17 @@ async def run_analysis_session(feature_extractor_agent, judge_agent):
         max_turns=12
     )
 
-    key_part_1 = "TERMINATE"
-    key_part_2 = "SESSION"
-
     task = (
         f"Act as {judge_agent.label}. Your objective is to conduct a professional evaluation of the user (file: 'landmarks.json') by comparing them against the **Range and Consistency** of your GOLD STANDARD samples.\n\n"
 
         "## LANDMARK ID REFERENCE\n"
-        f"```\n{landmark_map}\n```\n\n"
+        f"```\n{landmark_map()}\n```\n\n"
 
         "## DATA LOCATIONS\n"
         "1. **User Data**: `landmarks.json` (Structure: A List of landmarks, where each landmark has 33 points, and each points has attribute 'x', 'y', 'z', 'visability')\n"
-        f"2. **Reference Data**: Folder `reference/` containing files like `{judge_agent.name}_1.json`, `{judge_agent.name}_2.json`.\n\n"
+        f"2. **Reference Data**: Folder `reference/` containing files like `{judge_agent.name}_1.json`, `{judge_agent.name}_2.json`.\n"
+        "3. **Binary Copies (preferred)**: `from functions import load_landmarks, load_references`. "
+        f"`load_landmarks()` and `load_references('{judge_agent.name}')` return memory-mapped NumPy arrays of shape (frames, 33, 4) = [x, y, z, visibility].\n\n"
 
         "## OPERATIONAL PROTOCOL (STRICT SEQUENCE)\n"
         "You must execute the following phases in order. Do not skip steps.\n\n"
@@ -68,11 +131,12 @@ async def run_analysis_session(feature_extractor_agent, judge_agent):
         "   - *Example*: 'Calculate the **Angle** of the elbow (points 11-13-15).'\n"
         "3. **SELECT**: List the specific Landmark IDs required.\n\n"
 
-        "**PHASE 2: FEATURE ENGINEERING COMMAND (Action: Instruct Engineer)**\n"
-        "1. Direct the 'Feature_Extractor' to write a Python script.\n"
+        "**PHASE 2: FEATURE COMPUTATION (Action: Built-in Tool, or Instruct Engineer)**\n"
+        f"{fast_path(judge_agent)}"
+        "1. Otherwise, direct the 'Feature_Extractor' to write a Python script.\n"
         "2. **RESTRICTION**: **DO NOT WRITE CODE YOURSELF.** You are the Manager. Give detialed instructions.\n"
         "3. **CRITICAL INSTRUCTIONS FOR THE SCRIPT**:\n"
-        f"   - **Load**: Read `landmarks.json` and ALL `{judge_agent.name}*.json` files in `reference/`.\n"
+        f"   - **Load**: Use `load_landmarks()` and `load_references('{judge_agent.name}')` from the `functions` module (fall back to `landmarks.json` and the `{judge_agent.name}*.json` files in `reference/`).\n"
         "   - **Robustness**: The script must handle data structure variations (e.g., check if landmarks are in a list or dictionary) to avoid KeyErrors.\n"
         "   - **Feature Function**: Implement the math defined in Phase 1 (e.g., `calculate_angle`).\n"
         "   - **Process Data**: \n"
@@ -81,12 +145,12 @@ async def run_analysis_session(feature_extractor_agent, judge_agent):
         "   - **Calculate Statistics**: \n"
         "       a. **Reference Range**: Find `min()` and `max()` of the reference averages.\n"
         "       b. **Reference Mean**: Find `mean()` of the reference averages.\n"
-        "   - **Output**: The script **MUST print** one JSON string per feature:\n"
-        "     `{\"metric_name\": \"...\", \"user_value\": [88.5, 100.0, 70.0], \"ref_min\": 80.0, \"ref_max\": 100.0, \"ref_mean\": 90.0}`\n"
+        "   - **Output**: Never print per-frame values. Pass the user's per-frame list with the reference range to `summarize_values(values, ref_min, ref_max)` from the `functions` module and **print** one JSON string per feature:\n"
+        "     `{\"metric_name\": \"...\", **summarize_values(...), \"ref_min\": 80.0, \"ref_max\": 100.0, \"ref_mean\": 90.0}`\n"
         "4. **STOP** speaking immediately after giving the command.\n\n"
 
         "**PHASE 3: VERDICT & TERMINATION (Action: Analyze)**\n"
-        "1. Wait for the JSON output. Compare all values in `user_value` against `ref_min` and `ref_max`. The order in the list represent the time.\n"
+        "1. Wait for the JSON output. `inside`, `below`, `above` and `far` are the fractions of frames relative to `ref_min` and `ref_max`; `far` counts frames more than one `range_span` outside. `trend` holds the user's mean over equal slices of the clip, from the beginning to the end.\n"
         "2. Determine the `severity` score (int) using this RANGE-BASED RUBRIC:\n\n"
         
         "   --- JUDGMENT RUBRIC ---\n"
@@ -118,28 +182,31 @@ async def run_analysis_session(feature_extractor_agent, judge_agent):
         "   - **Verdict**: **CRITICAL**. The user completely fails the metric.\n"
         "   - **Suggestion**: Urgent warning. (e.g., 'Stop! This is completely wrong. You must reset your stance immediately.')\n\n"
 
-        "2. **Final Output**: You MUST output **Three JSON Objects** containing the fields below, followed by the termination keyword.\n"
+        "2. **Final Output**: You MUST output **one JSON object** holding three verdicts, and nothing after it. The session ends as soon as it is posted.\n"
         "   **Required JSON Structure**:\n"
         "```json\n"
-        "{"
+        "{\"verdicts\": [{"
         "\"metric_analyzed\": \"(e.g. Elbow Angle)\","
         "\"severity\": (-2, -1 or 1, 2, 3),"
         "\"suggestion\": \"(Write your advice here based on the data difference)\""
-        "}"
-        "```\n"
-        f"3. ONLY THEN, output the exact keyword consisting of '{key_part_1}' and '{key_part_2}' joined by an underscore.\n\n"
+        "}, ...]}"
+        "```\n\n"
     )
 
     print(f"--- Running Session: {judge_agent.name} ---")
-    result = await team.run(task=task)
-
-    print(result)
+    result = await run_traced(team, task, cancellation_token)
 
     final_comment = ""
-
     for msg in reversed(result.messages):
         if isinstance(msg, TextMessage) and msg.source == judge_agent.name:
             final_comment = msg.content
             break
 
-    return final_comment
\ No newline at end of file
+    verdict = parse_verdict(final_comment)
+    if verdict is None: # out of turns or malformed JSON, one schema-constrained rewrite of its last answer
+        print(f"{judge_agent.name}: no valid verdict ({result.stop_reason}), retrying")
+        verdict = await structured_retry(
+            get_model_client(judge_agent.model_name), JudgeVerdict, VERDICT_RETRY_PROMPT, final_comment, judge_agent.name
+        )
+
+    return verdict.model_dump_json() if verdict else ""
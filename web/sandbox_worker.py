@@ -0,0 +1,87 @@
+# warm python interpreter for _sandbox.SandboxPool, runs the agents' scripts in-process with numpy already imported
+# stdin, one json per line: {"id", "cwd", "code"}
+# stdout, one json per line: {"status": "ready"} once, then {"id", "exit_code", "output"}
+import contextlib
+import io
+import json
+import os
+import sys
+import traceback
+from argparse import ArgumentParser
+
+protocol, jobs = sys.stdout, sys.stdin
+sys.stdout = sys.stderr # the scripts' prints are captured per call, anything else stays off the protocol stream
+sys.stdin = io.StringIO() # and input() must not eat the next job
+
+import numpy # noqa: F401, the point of keeping this process around
+
+def reply(**msg):
+    protocol.write(json.dumps(msg) + "\n")
+    protocol.flush()
+
+def limit_memory(mem_mb):
+    try:
+        import resource
+    except ImportError: # windows, the parent's timeout is the only limit
+        return
+    if mem_mb > 0:
+        limit = mem_mb * 2 ** 20
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+def forget(cwd):
+    # modules imported from a session dir (its functions.py) are dropped, the next session has its own
+    for name in [m for m, mod in sys.modules.items() if os.path.dirname(os.path.abspath(getattr(mod, "__file__", None) or "/")) == cwd]:
+        del sys.modules[name]
+
+def run(cwd, code, max_output):
+    out = io.StringIO()
+    exit_code = 0
+    home = os.getcwd()
+    sys.path.insert(0, cwd)
+    try:
+        os.chdir(cwd)
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(out):
+            try:
+                exec(compile(code, "<agent script>", "exec"), {"__name__": "__main__", "__builtins__": __builtins__})
+            except SystemExit as e:
+                if e.code is None or isinstance(e.code, int):
+                    exit_code = e.code or 0
+                else:
+                    print(e.code)
+                    exit_code = 1
+            except MemoryError:
+                exit_code = 1
+                print("MemoryError: the script went over the sandbox memory limit")
+            except BaseException:
+                exit_code = 1
+                traceback.print_exc()
+    finally:
+        os.chdir(home)
+        sys.path.remove(cwd)
+        forget(cwd)
+    output = out.getvalue()
+    if len(output) > max_output:
+        output = output[:max_output] + f"\n... output truncated, {len(output) - max_output} more characters"
+    return exit_code, output
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--mem-mb", default=0, type=int)
+    parser.add_argument("--max-output", default=20000, type=int)
+    args = parser.parse_args()
+    limit_memory(args.mem_mb)
+    reply(status="ready")
+    for line in jobs:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            msg = json.loads(line)
+        except ValueError:
+            print(f"sandbox_worker: bad line {line!r}")
+            continue
+        exit_code, output = run(msg["cwd"], msg["code"], args.max_output)
+        reply(id=msg["id"], exit_code=exit_code, output=output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+import asyncio
+import os
+import random
+import time
+import weakref
+
+import openai
+from autogen_core import CancellationToken
+from autogen_ext.models.openai import OpenAIChatCompletionClient
+
+from _trace import tracer
+
+# judge fan-out: a cap on judge sessions over all analyses, a deadline per judge covering its retries and hedges,
+# and per-model request limits (requests in flight, a token bucket, 429 backoff) shared by every agent on that model
+
+MAX_JUDGES = int(os.getenv("AURA_MAX_JUDGES", 4)) # judge sessions at once
+JUDGE_DEADLINE = float(os.getenv("AURA_JUDGE_DEADLINE", 240)) # seconds per judge from its first attempt
+JUDGE_RETRIES = 1 # attempts after a failed one, while the deadline allows
+HEDGE_AFTER = float(os.getenv("AURA_JUDGE_HEDGE_AFTER", 0)) # seconds before a slow judge gets a second attempt, 0 = off
+BACKOFF = 1.0 # seconds, doubled per retry
+MAX_BACKOFF = 30.0
+
+MODEL_CONCURRENCY = int(os.getenv("AURA_MODEL_CONCURRENCY", 8)) # requests in flight per model
+MODEL_RPM = float(os.getenv("AURA_MODEL_RPM", 0)) # requests per minute per model, 0 = no limit
+MODEL_RETRIES = 4
+MODEL_LIMITS = {} # model -> {"concurrency": ..., "rpm": ...}, overrides the two above
+RETRYABLE = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+def backoff(attempt, base=BACKOFF, cap=MAX_BACKOFF):
+    # full jitter, so judges that failed together do not come back together
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+def retry_after(error):
+    # seconds the server asked for, if it did
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        try:
+            return float(headers[name]) * scale
+        except (KeyError, TypeError, ValueError):
+            pass
+    return None
+
+class TokenBucket(object):
+    # `rate` tokens per second up to `burst`; pause() holds every caller back after a 429
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.tokens = self.burst
+        self.stamp = time.monotonic()
+        self.paused_until = 0.0
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def reserve(self):
+        # takes a token now and returns how long to wait for it; tokens go negative so later callers queue behind
+        now = time.monotonic()
+        wait = max(0.0, self.paused_until - now)
+        if self.rate > 0:
+            self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+            self.tokens -= 1
+            wait = max(wait, -self.tokens / self.rate)
+        return wait
+
+    async def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+class ModelLimiter(object):
+    def __init__(self, model, concurrency=None, rpm=None, retries=MODEL_RETRIES):
+        limits = MODEL_LIMITS.get(model, {})
+        self.model = model
+        self.slots = asyncio.Semaphore(concurrency or limits.get("concurrency", MODEL_CONCURRENCY))
+        self.bucket = TokenBucket((rpm if rpm is not None else limits.get("rpm", MODEL_RPM)) / 60.0)
+        self.retries = retries
+
+    async def wait_turn(self):
+        start = time.time()
+        if await self.bucket.acquire() > 0:
+            tracer.record("rate_limited", start, time.time(), model=self.model)
+
+    async def call(self, fn):
+        # fn() -> awaitable of one request, retried on 429, connection errors and 5xx
+        attempt = 0
+        while True:
+            async with self.slots:
+                await self.wait_turn()
+                try:
+                    return await fn()
+                except RETRYABLE as e:
+                    if attempt >= self.retries or getattr(e, "code", None) == "insufficient_quota":
+                        raise
+                    delay = retry_after(e) or backoff(attempt)
+                    if isinstance(e, openai.RateLimitError):
+                        self.bucket.pause(delay) # everyone on this model backs off, not just this request
+                    print(f"{self.model}: {type(e).__name__}, retry {attempt + 1} in {delay:.1f}s")
+            attempt += 1
+            await asyncio.sleep(delay)
+
+class LimitedChatCompletionClient(OpenAIChatCompletionClient):
+    # the openai client does not retry by itself, ModelLimiter does, so a 429 slows the whole model down
+    def __init__(self, **kwargs):
+        kwargs.setdefault("max_retries", 0)
+        super().__init__(**kwargs)
+        self.limiter = ModelLimiter(kwargs["model"])
+
+    async def create(self, *args, **kwargs):
+        return await self.limiter.call(lambda: super(LimitedChatCompletionClient, self).create(*args, **kwargs))
+
+    async def create_stream(self, *args, **kwargs):
+        # a stream holds its slot until the end and is not retried, the chunks already went out
+        async with self.limiter.slots:
+            await self.limiter.wait_turn()
+            async for chunk in super().create_stream(*args, **kwargs):
+                yield chunk
+
+def _forget(task):
+    # an abandoned attempt, its error is not news
+    if not task.cancelled():
+        task.exception()
+
+class JudgeScheduler(object):
+    def __init__(self, max_judges=MAX_JUDGES, deadline=JUDGE_DEADLINE, retries=JUDGE_RETRIES, hedge_after=HEDGE_AFTER):
+        self.max_judges = max_judges
+        self.deadline = deadline
+        self.retries = retries
+        self.hedge_after = hedge_after
+        self.running = 0
+        self._slots = weakref.WeakKeyDictionary() # event loop -> semaphore, the bench starts a loop per run
+
+    def _semaphore(self):
+        loop = asyncio.get_running_loop()
+        slots = self._slots.get(loop)
+        if slots is None:
+            slots = self._slots[loop] = asyncio.Semaphore(self.max_judges)
+        return slots
+
+    async def run(self, name, attempt, ok=bool, hedge=False):
+        # attempt(n, cancellation_token) -> coroutine of try n, n > 0 must not share state with the others when hedge is set
+        # -> (result, status), status "ok", "failed" or "timeout" with result None; the deadline starts once a slot is free
+        slots = self._semaphore()
+        async with slots:
+            self.running += 1
+            try:
+                return await self._attempts(name, attempt, ok, hedge, slots)
+            finally:
+                self.running -= 1
+
+    async def _attempts(self, name, attempt, ok, hedge, slots):
+        loop = asyncio.get_running_loop()
+        end = loop.time() + self.deadline
+        hedge_at = loop.time() + self.hedge_after if hedge and self.hedge_after > 0 else None
+        running = {} # task -> cancellation token
+        extra_slots = 0
+        tries = failures = 0
+
+        def launch():
+            nonlocal tries
+            token = CancellationToken()
+            running[asyncio.ensure_future(attempt(tries, token))] = token
+            tries += 1
+
+        launch()
+        try:
+            while True:
+                now = loop.time()
+                if now >= end:
+                    print(f"{name}: no result within {self.deadline:.0f}s ({tries} attempts)")
+                    return None, "timeout"
+                wake = end if hedge_at is None else min(end, hedge_at)
+                done, _ = await asyncio.wait(list(running), timeout=wake - now, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    running.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        print(f"{name} attempt Error: {e}")
+                        result = None
+                    if result is not None and ok(result):
+                        return result, "ok"
+                    failures += 1
+                if done and not running:
+                    if failures > self.retries:
+                        return None, "failed"
+                    delay = min(backoff(failures - 1), max(end - loop.time(), 0))
+                    print(f"{name}: retry in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                    launch()
+                elif hedge_at is not None and loop.time() >= hedge_at:
+                    hedge_at = None
+                    if not slots.locked(): # only with spare capacity, a hedge must not delay another judge
+                        await slots.acquire()
+                        extra_slots += 1
+                        print(f"{name}: slow, starting a hedge attempt")
+                        launch()
+        finally:
+            for task, token in running.items():
+                token.cancel()
+                task.cancel()
+                task.add_done_callback(_forget)
+            for _ in range(extra_slots):
+                slots.release()
+
+scheduler = JudgeScheduler()
@@ -0,0 +1,73 @@
+import json
+
+from metrics import METRICS, compute_metric
+
+# compact view of a metric series for the agents: a handful of segment means instead of every frame,
+# rounded to what the unit can resolve, plus where the frames sit relative to the reference range.
+# Size stays the same however long the clip is.
+
+TREND_POINTS = 8
+PROMPT_LANDMARKS = [0, 7, 8] + list(range(11, 25)) # head, arms, hands and hips; the legs are usually out of frame
+
+def digits_for(unit):
+    return 0 if unit == "deg" else 2
+
+def summarize_values(values, ref_min=None, ref_max=None, points=8, digits=2):
+    """Compact stats of a per-frame series: `trend` (segment means from begin to end), mean/p10/p90/min/max,
+    and the fraction of frames `inside`, `below` and `above` [ref_min, ref_max] or `far` (over one range span outside)."""
+    import numpy as np
+
+    def q(v):
+        v = float(v)
+        return None if v != v else round(v, digits) if digits else int(round(v))
+
+    values = np.asarray(values, dtype=np.float64).ravel()
+    valid = values[~np.isnan(values)]
+    out = {"frames": int(len(values)), "valid": int(len(valid))}
+    if not len(valid):
+        return out
+    segments = [s for s in np.array_split(values, min(points, len(values))) if (~np.isnan(s)).any()]
+    out["trend"] = [q(np.nanmean(s)) for s in segments]
+    p10, p90 = np.percentile(valid, [10, 90])
+    out.update(mean=q(valid.mean()), p10=q(p10), p90=q(p90), min=q(valid.min()), max=q(valid.max()))
+    if ref_min is not None and ref_max is not None:
+        span = max(ref_max - ref_min, 1e-9)
+        dist = np.maximum(ref_min - valid, 0) + np.maximum(valid - ref_max, 0)
+        out.update(
+            inside=round(float((dist == 0).mean()), 2),
+            below=round(float((valid < ref_min).mean()), 2),
+            above=round(float((valid > ref_max).mean()), 2),
+            far=round(float((dist > span).mean()), 2),
+        )
+    return out
+
+def summarize_metric(name, user, ref_stats, timestamps=None, points=TREND_POINTS):
+    # same keys the Feature_Extractor prints through functions.summarize_values
+    unit = METRICS[name][1]
+    ref_min, ref_max = ref_stats.get("ref_min"), ref_stats.get("ref_max")
+    summary = {"metric_name": name, "unit": unit}
+    summary.update(summarize_values(compute_metric(name, user, timestamps), ref_min, ref_max, points, digits_for(unit)))
+    summary.update(ref_min=ref_min, ref_max=ref_max, ref_mean=ref_stats.get("ref_mean"))
+    return summary
+
+def landmark_map(ids=PROMPT_LANDMARKS):
+    return "\n    ".join(f"{i} - {LANDMARK_NAMES[i]}" for i in ids)
+
+def clip_text(text, max_chars):
+    # keep the start and the end, the verdict JSON is at the end of a judge's answer
+    if len(text) <= max_chars:
+        return text
+    head = max_chars // 4
+    return text[:head] + " ... " + text[len(text) - (max_chars - head - 5):]
+
+def dumps(obj):
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+LANDMARK_NAMES = [
+    "nose", "left eye (inner)", "left eye", "left eye (outer)", "right eye (inner)", "right eye", "right eye (outer)",
+    "left ear", "right ear", "mouth (left)", "mouth (right)",
+    "left shoulder", "right shoulder", "left elbow", "right elbow", "left wrist", "right wrist",
+    "left pinky", "right pinky", "left index", "right index", "left thumb", "right thumb",
+    "left hip", "right hip", "left knee", "right knee", "left ankle", "right ankle",
+    "left heel", "right heel", "left foot index", "right foot index",
+]
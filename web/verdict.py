@@ -0,0 +1,98 @@
+import json
+from typing import Literal, Sequence
+
+from pydantic import BaseModel, Field, ValidationError
+from autogen_agentchat.base import TerminationCondition
+from autogen_agentchat.messages import StopMessage, TextMessage
+from autogen_core.models import SystemMessage, UserMessage
+
+# typed judge / aggregator output, checked as the team runs so a session stops at the first valid verdict
+
+class MetricVerdict(BaseModel):
+    metric_analyzed: str
+    severity: Literal[-2, -1, 1, 2, 3]
+    suggestion: str
+
+class JudgeVerdict(BaseModel):
+    verdicts: list[MetricVerdict] = Field(min_length=1, max_length=5)
+
+class Suggestion(BaseModel):
+    suggestion: str
+    severity: float
+    description: str
+    judge: str
+
+class AggregatedReport(BaseModel):
+    suggestions: list[Suggestion]
+
+def parse_verdict(text):
+    # a whole JudgeVerdict, or the valid {"metric_analyzed", "severity", "suggestion"} objects found in free text
+    if not text:
+        return None
+    try:
+        return JudgeVerdict.model_validate_json(text)
+    except ValidationError:
+        pass
+    decoder = json.JSONDecoder()
+    found = []
+    i = text.find("{")
+    while i != -1:
+        try:
+            obj, end = decoder.raw_decode(text, i)
+        except ValueError:
+            i = text.find("{", i + 1)
+            continue
+        items = obj.get("verdicts") if isinstance(obj, dict) and isinstance(obj.get("verdicts"), list) else [obj]
+        for item in items:
+            try:
+                found.append(MetricVerdict.model_validate(item))
+            except ValidationError:
+                pass
+        i = text.find("{", end)
+    return JudgeVerdict(verdicts=found[:5]) if found else None
+
+def parse_report(text):
+    # aggregator output: an AggregatedReport or the bare list of suggestions
+    try:
+        data = json.loads(text)
+        if isinstance(data, list):
+            data = {"suggestions": data}
+        return AggregatedReport.model_validate(data)
+    except (TypeError, ValueError): # ValidationError is a ValueError
+        return None
+
+async def structured_retry(model_client, schema, instruction, text, source="user"):
+    # one targeted call with the schema as response_format, None if that fails too
+    try:
+        result = await model_client.create(
+            [SystemMessage(content=instruction), UserMessage(content=text or "(empty)", source=source)],
+            json_output=schema,
+        )
+        return schema.model_validate_json(result.content)
+    except Exception as e:
+        print(f"structured_retry {schema.__name__} failed: {e}")
+        return None
+
+class VerdictTermination(TerminationCondition):
+    # stop as soon as one of `sources` posts a text message holding a valid JudgeVerdict
+    def __init__(self, sources: Sequence[str]):
+        self._sources = set(sources)
+        self._terminated = False
+
+    @property
+    def terminated(self) -> bool:
+        return self._terminated
+
+    async def __call__(self, messages):
+        if self._terminated:
+            return None
+        for message in messages:
+            if not isinstance(message, TextMessage) or message.source not in self._sources:
+                continue
+            if parse_verdict(message.content) is not None:
+                self._terminated = True
+                return StopMessage(content=f"Verdict from {message.source}", source="VerdictTermination")
+        return None
+
+    async def reset(self):
+        self._terminated = False
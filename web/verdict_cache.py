@@ -0,0 +1,77 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+CACHE_FILE = ".cache/verdicts.json"
+CACHE_TTL = 7 * 24 * 3600 # seconds
+CACHE_MAX_ENTRIES = 256
+QUANT_STEP = 1e-3 # landmark jitter below this does not change the key
+
+def landmark_digest(data, step=QUANT_STEP):
+    q = np.round(np.asarray(data, dtype=np.float64) / step).astype(np.int32)
+    return hashlib.sha256(str(q.shape).encode() + q.tobytes()).hexdigest()
+
+def cache_key(*parts):
+    return hashlib.sha256("\x1f".join(map(str, parts)).encode()).hexdigest()
+
+class VerdictCache(object):
+    # LRU + TTL, persisted as json so a restart keeps the verdicts
+    def __init__(self, path=CACHE_FILE, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict() # key -> [expires_at, value]
+        self._load()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            if item[0] < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return item[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = [time.time() + self.ttl, value]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._save()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._save()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"VerdictCache: ignoring unreadable cache {self.path}: {e}")
+            return
+        now = time.time()
+        for key, (expires_at, value) in entries: # stored oldest first
+            if expires_at >= now:
+                self._entries[key] = [expires_at, value]
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump([[k, v] for k, v in self._entries.items()], f)
+        os.replace(tmp, self.path)